@@ -1,11 +1,10 @@
 from sba.bandaveraging import calculate_differences
-from sba.io import load_data_file
+from sba.io import load_data_files, find_data_files
 from sba.chla import HydroColor
 from matplotlib import pyplot as plt
-from pathlib import Path
 
-data_files = Path("data").glob("*processed.tab")
-labels, wavelengths, Eds, Lws, R_rss = zip(*[load_data_file(file) for file in data_files])
+data_files = find_data_files("data")
+labels, wavelengths, Eds, Lws, R_rss = zip(*load_data_files(data_files))
 
 difference_absolute, difference_relative = zip(*[calculate_differences(*HydroColor(wavelengths_data, Ed, Lw, R_rs)) for wavelengths_data, Ed, Lw, R_rs in zip(wavelengths, Eds, Lws, R_rss)])
 
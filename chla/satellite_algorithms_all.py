@@ -1,10 +1,9 @@
 from sba.bandaveraging import calculate_differences
-from sba.io import load_data_file
+from sba.io import load_data_file, find_data_files
 from sba.chla import satellite_algorithms, satellite_algorithm_labels
 from matplotlib import pyplot as plt
-from pathlib import Path
 
-data_files = Path("data").glob("*processed.tab")
+data_files = find_data_files("data")
 
 for file in data_files:
     label, wavelengths_data, Ed, Lw, R_rs = load_data_file(file)
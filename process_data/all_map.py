@@ -1,17 +1,14 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.basemap import Basemap
-from astropy.io.ascii import read
 from astropy import table
 from astropy import units as u
-from pathlib import Path
+from sba.io import find_data_files, read_data_table, get_label
 
-folder = Path("data")
+all_data_files = find_data_files("data")
 
-all_data_files = sorted(folder.glob("*processed.tab"))
-
-data = [read(file, include_names=["Latitude", "Longitude"]) for file in all_data_files]
-labels = [file.stem[:-10] for file in all_data_files]
+data = [read_data_table(file, include_names=["Latitude", "Longitude"]) for file in all_data_files]
+labels = [get_label(file) for file in all_data_files]
 colours = ["xkcd:royal blue", "xkcd:pale yellow", "xkcd:lime green", "xkcd:orange", "xkcd:navy", "xkcd:bright pink", "xkcd:vomit", "xkcd:light orange", "xkcd:hunter green", "xkcd:light brown", "xkcd:rust brown", "xkcd:magenta", "xkcd:magenta", "xkcd:neon green", "xkcd:olive green", "xkcd:purple", "xkcd:red", "xkcd:black"]
 
 for tab, label, colour in zip(data, labels, colours):
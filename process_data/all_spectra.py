@@ -1,23 +1,16 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from astropy.io.ascii import read
-from pathlib import Path
 from sba.data_processing import split_spectrum
+from sba.io import find_data_files, read_data_table
 
-folder = Path("data")
-
-all_data_files = sorted(folder.glob("*processed.tab"))
-
-data_all = [read(file) for file in all_data_files]
+data_all = [read_data_table(file) for file in find_data_files("data")]
 N_all = [len(data) for data in data_all]
 N_total = sum(N_all)
 
-labels = [file.stem[:-10] for file in all_data_files]
-
 wavelength_bin_size = 1
 wavelength_range = np.arange(300, 1350, wavelength_bin_size)
 wavelengths_all = [split_spectrum(data, "Ed")[0] for data in data_all]
-wavelength_extremes = [[wavelength_range[0], wavelength_range[-1]] for wavelength_range in wavelengths_all]
+wavelength_extremes = [[wavelengths.min(), wavelengths.max()] for wavelengths in wavelengths_all]
 wavelengths_bincount = np.zeros_like(wavelength_range)
 for N, extremes in zip(N_all, wavelength_extremes):
     wavelengths_bincount[np.where((wavelength_range >= extremes[0]-wavelength_bin_size/2) & (wavelength_range <= extremes[-1]+wavelength_bin_size/2))] += N
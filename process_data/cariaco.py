@@ -3,23 +3,16 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data, find_auxiliary_information_seabass
-from sba.data_processing import get_keys_with_label, remove_negative_R_rs, remove_rows_based_on_threshold, convert_to_unit, add_Lw_from_Ed_Rrs
+from sba.io import read, write_data, read_seabass, auxiliary_information_seabass
+from sba.data_processing import remove_negative_R_rs, remove_rows_based_on_threshold, remove_rows_with_missing_values, remove_rows_with_mask, convert_to_unit, add_Lw_from_Ed_Rrs, RowFilter
 
 folder = Path("data/CARIACO/")
 files = sorted(folder.glob("*.txt"))
 
 tabs = []
 for file in files:
-    for skiprows in range(40, 70):
-        try:
-            wavelengths, Ed, Rrs = np.loadtxt(file, skiprows=skiprows, unpack=True, usecols=[0,3,5])
-        except Exception:
-            continue
-        else:
-            break
-
-    date, time, lon, lat = find_auxiliary_information_seabass(file)
+    header, (wavelengths, Ed, Rrs) = read_seabass(file, unpack=True, usecols=[0,3,5])
+    date, time, lon, lat = auxiliary_information_seabass(header)
 
     cols = ["Date", "Time", "Latitude", "Longitude"] + [f"Ed_{wvl:.0f}" for wvl in wavelengths] + [f"R_rs_{wvl:.0f}" for wvl in wavelengths]
     dtype = [int, "S8", float, float] + 2 * [float for wvl in wavelengths]
@@ -33,23 +26,23 @@ convert_to_unit(data, "R_rs", 1 / u.steradian)
 
 data = add_Lw_from_Ed_Rrs(data)
 
+# Collect the rows to remove, then remove them all at once
+row_filter = RowFilter(data)
+
 # Remove rows with NaN values
-R_rs_keys = get_keys_with_label(data, "R_rs")
-remove_indices = [i for i, row_mask in enumerate(data.mask) if any(row_mask[key] for key in R_rs_keys)]
-data.remove_rows(remove_indices)
-print(f"Removed {len(remove_indices)} rows with NaN values")
+remove_rows_with_missing_values(data, "R_rs", row_filter=row_filter)
 
 # Remove rows with missing R_rs values (< -90)
-remove_rows_based_on_threshold(data, "R_rs", "<", -90)
+remove_rows_based_on_threshold(data, "R_rs", "<", -90, row_filter=row_filter)
 
 # Remove rows with missing Ed values (<)
-remove_indices = [i for i, row in enumerate(data) if row["Ed_600"] <= 0.1]
-data.remove_rows(remove_indices)
-print(f"Removed {len(remove_indices)} rows with missing Ed values")
+remove_rows_with_mask(data, data["Ed_600"] <= 0.1, "missing Ed values", row_filter=row_filter)
+
+remove_negative_R_rs(data, row_filter=row_filter)
 
-remove_negative_R_rs(data)
+remove_rows_based_on_threshold(data, "R_rs", ">", 0.8, row_filter=row_filter)
 
-remove_rows_based_on_threshold(data, "R_rs", ">", 0.8)
+row_filter.apply()
 
 map_data(data, data_label="CARIACO", projection='gnom', lat_0=10.5, lon_0=-64.67, llcrnrlon=-70, urcrnrlon=-59, llcrnrlat=5, urcrnrlat=15, resolution="h", parallels=np.arange(4, 16, 2), meridians=np.arange(-70, -56, 2))
 
@@ -3,7 +3,7 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data, find_auxiliary_information_seabass
+from sba.io import read, write_data, read_seabass_table, find_auxiliary_information_seabass
 from sba.data_processing import remove_rows_based_on_threshold, get_keys_with_label, remove_negative_R_rs, convert_to_unit, rename_columns
 from datetime import datetime
 
@@ -17,20 +17,7 @@ master_table.rename_column("!Station", "Station")
 master_table.remove_rows(np.where(master_table["time_GMT"] == "-999")[0])
 
 def read_data_file(filename):
-    header = read(filename, data_start=26, data_end=27)
-    header["col1"][0] = "year"
-    header = header[0].as_void()
-
-    for skiprows in range(85, 100):
-        try:
-            data_array = np.genfromtxt(filename, skip_header=skiprows, dtype=[int, int, "S10"] + [float]*(len(header)-3))
-        except Exception:
-            continue
-        else:
-            break
-
-    data_table = table.Table(data=data_array, names=header)
-
+    _, data_table = read_seabass_table(filename)
     return data_table
 
 def convert_timestamp(timestamp):
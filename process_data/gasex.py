@@ -3,7 +3,7 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data, find_auxiliary_information_seabass
+from sba.io import read, write_data, read_seabass, auxiliary_information_seabass
 from sba.data_processing import get_keys_with_label, convert_to_unit, add_Lw_from_Ed_Rrs
 
 folder = Path("data/GasEx/")
@@ -11,12 +11,8 @@ files = list(folder.glob("AOP*.txt"))
 
 tabs = []
 for file in files:
-    try:
-        wavelengths, Es, Rrs = np.loadtxt(file, delimiter="\t", skiprows=40, unpack=True, usecols=[0,1,5])
-    except:
-        wavelengths, Es, Rrs = np.loadtxt(file, delimiter="\t", skiprows=41, unpack=True, usecols=[0,1,5])
-
-    date, time, lon, lat = find_auxiliary_information_seabass(file)
+    header, (wavelengths, Es, Rrs) = read_seabass(file, delimiter="\t", unpack=True, usecols=[0,1,5])
+    date, time, lon, lat = auxiliary_information_seabass(header)
 
     cols = ["Date", "Time", "Latitude", "Longitude"] + [f"Ed_{wvl:.0f}" for wvl in wavelengths] + [f"R_rs_{wvl:.0f}" for wvl in wavelengths]
     dtype = [int, "S8", float, float] + 2 * [float for wvl in wavelengths]
@@ -2,11 +2,11 @@ import numpy as np
 from astropy import table
 from astropy import units as u
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
-from sba.data_processing import convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
+from sba.io import read_pangaea, write_data
+from sba.data_processing import convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs, remove_rows_with_mask
 
-Ed = read("data/HE302/HE302_irrad.tab", data_start=186, header_start=185)
-Rrs = read("data/HE302/HE302_rrs.tab", data_start=186, header_start=185)
+_, Ed = read_pangaea("data/HE302/HE302_irrad.tab")
+_, Rrs = read_pangaea("data/HE302/HE302_rrs.tab")
 
 data = table.join(Ed, Rrs, keys=["Event"])
 
@@ -18,9 +18,7 @@ convert_to_unit(data, "R_rs", 1 / u.steradian)
 
 data = add_Lw_from_Ed_Rrs(data)
 
-remove_indices = [i for i, row in enumerate(data) if row["R_rs_800"] >= 0.003]
-data.remove_rows(remove_indices)
-print(f"Removed {len(remove_indices)} rows with values of R_rs(800 nm) >= 0.003")
+remove_rows_with_mask(data, data["R_rs_800"] >= 0.003, "values of R_rs(800 nm) >= 0.003")
 
 for key in ["Date/Time", "Latitude", "Longitude", "Altitude [m]"]:
     data.rename_column(f"{key}_1", key)
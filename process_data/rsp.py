@@ -3,7 +3,7 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
+from sba.io import read_seabass_table, write_data
 from sba.data_processing import get_keys_with_label, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
 
 folder = Path("data/RSP/")
@@ -12,12 +12,7 @@ files = list(folder.glob("*.txt"))
 data_tables = []
 
 for file in files:
-    data = read(file, data_start=37)
-    header = read(file, data_start=32, data_end=33)
-    header["col1"][0] = "date"
-    header = header[0].as_void()
-    for key, new_key in zip(data.keys(), header):
-        data.rename_column(key, new_key)
+    _, data = read_seabass_table(file)
 
     data.rename_column("lat", "Latitude")
     data.rename_column("lon", "Longitude")
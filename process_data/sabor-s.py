@@ -3,7 +3,7 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
+from sba.io import read_seabass_table, write_data
 from sba.data_processing import get_keys_with_label, remove_negative_R_rs, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
 import csv
 
@@ -14,13 +14,7 @@ files = list(folder.glob("CCNY*.sb"))
 
 data_tables = []
 for file in files:
-    data_table = read(file, data_start=35)
-    header = read(files[0], data_start=32, data_end=33)
-    header["col1"][0] = "year"
-    header = header[0].as_void()
-
-    for key, new_key in zip(data_table.keys(), header):
-        data_table.rename_column(key, new_key)
+    _, data_table = read_seabass_table(file)
 
     data_table.remove_columns(get_keys_with_label(data_table, "stokes"))
     data_table.remove_columns(get_keys_with_label(data_table, "sd"))
@@ -2,12 +2,12 @@ import numpy as np
 from astropy import table
 from astropy import units as u
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
-from sba.data_processing import get_keys_with_label, remove_negative_R_rs, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
+from sba.io import read_pangaea, write_data
+from sba.data_processing import get_keys_with_label, remove_negative_R_rs, remove_rows_with_mask, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
 
 wavelengths = np.arange(350, 1301, 1)
 
-Ld = read("data/SeaSWIR/SeaSWIR_ASD_Ldspec.tab", data_start=974, header_start=973)
+_, Ld = read_pangaea("data/SeaSWIR/SeaSWIR_ASD_Ldspec.tab")
 Ldkeys = get_keys_with_label(Ld, "Ld")
 for Ldkey, wvl in zip(Ldkeys, wavelengths):
     # multiply by pi to convert L to E (Mobley99)
@@ -19,7 +19,7 @@ for Ldkey, wvl in zip(Ldkeys, wavelengths):
 Ed = Ld
 # Units of Ld are not provided
 
-Rrs = read("data/SeaSWIR/SeaSWIR_ASD_Rw.tab", data_start=974, header_start=973)
+_, Rrs = read_pangaea("data/SeaSWIR/SeaSWIR_ASD_Rw.tab")
 rename_columns(Rrs, "Refl (", "R_rs_", strip=True)
 R_rs_keys = get_keys_with_label(Rrs, "R_rs")
 for R_rs_k in R_rs_keys:
@@ -40,9 +40,7 @@ for key in data.keys():
         data.remove_column(key)
 
 # Check for rows where no Ed data were provided
-remove_indices = [i for i, mask_row in enumerate(data.mask) if mask_row["Ed_500"]]
-data.remove_rows(remove_indices)
-print(f"Removed {len(remove_indices)} rows without Ed data")
+remove_rows_with_mask(data, np.ma.getmaskarray(data["Ed_500"]), "no Ed data")
 
 remove_negative_R_rs(data)
 
@@ -2,21 +2,19 @@ import numpy as np
 from astropy import table
 from astropy import units as u
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
+from sba.io import read_pangaea, write_data
 from sba.data_processing import remove_negative_R_rs, get_keys_with_label, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
 
-Ed = read("data/SeaSWIR/SeaSWIR_TRIOS_Ed.tab", data_start=238, header_start=237)
+_, Ed = read_pangaea("data/SeaSWIR/SeaSWIR_TRIOS_Ed.tab")
 
 wavelengths = np.arange(350, 902.5, 2.5)
 
-Rrs = read("data/SeaSWIR/SeaSWIR_TRIOS_Rw.tab", data_start=473, format="no_header", delimiter="\t")
 colnames = ["Event", "Campaign", "Station", "Location", "Comment (TRIOS missing?)", "Comment (ASD missing?)", "ID", "Latitude", "Longitude", "Date/Time (water sample, UTC)", "Date/Time (TRIOS start, UTC)", "Date/Time (TRIOS end, UTC)", "Ratio (drho/rho, 750nm)", "Ratio (dLsky/Lsky, 750nm)", "Ratio (dLw/Lw, 750nm)", "Ratio (dEd/Ed, 750nm)", "Ratio (d(Lsk/Ed)/(Lsk/Ed), 750nm)"]
 colnames_rrs = [f"R_rs_{wvl:.1f}" for wvl in wavelengths]
 colnames_rrs2 = [f"R_rs_err_{wvl:.1f}" for wvl in wavelengths]
 colnames = colnames + colnames_rrs + colnames_rrs2
 
-for j, newname in enumerate(colnames, 1):
-    Rrs.rename_column(f"col{j}", newname)
+_, Rrs = read_pangaea("data/SeaSWIR/SeaSWIR_TRIOS_Rw.tab", format="no_header", fast_reader=False, names=colnames)
 Rrs.remove_columns(colnames_rrs2)
 Rrs.remove_columns(['Ratio (drho/rho, 750nm)', 'Ratio (dLsky/Lsky, 750nm)', 'Ratio (dLw/Lw, 750nm)', 'Ratio (dEd/Ed, 750nm)', 'Ratio (d(Lsk/Ed)/(Lsk/Ed), 750nm)'])
 
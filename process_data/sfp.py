@@ -3,7 +3,7 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data, find_auxiliary_information_seabass
+from sba.io import read, write_data, read_seabass, auxiliary_information_seabass
 from sba.data_processing import convert_to_unit, add_Lw_from_Ed_Rrs
 
 folder = Path("data/SFP/")
@@ -11,15 +11,8 @@ files = sorted(folder.glob("*.txt"))
 
 tabs = []
 for file in files:
-    for skiprows in range(44, 52):
-        try:
-            wavelengths, Ed, Rrs = np.loadtxt(file, skiprows=skiprows, unpack=True, usecols=[0,3,4])
-        except Exception:
-            continue
-        else:
-            break
-
-    date, time, lon, lat = find_auxiliary_information_seabass(file)
+    header, (wavelengths, Ed, Rrs) = read_seabass(file, unpack=True, usecols=[0,3,4])
+    date, time, lon, lat = auxiliary_information_seabass(header)
 
     cols = ["Date", "Time", "Latitude", "Longitude"] + [f"Ed_{wvl:.2f}" for wvl in wavelengths] + [f"R_rs_{wvl:.2f}" for wvl in wavelengths]
     dtype = [int, "S8", float, float] + 2 * [float for wvl in wavelengths]
@@ -3,20 +3,13 @@ from astropy import table
 from astropy import units as u
 from pathlib import Path
 from sba.plotting import plot_spectra, map_data
-from sba.io import read, write_data
+from sba.io import read_seabass_table, write_data
 from sba.data_processing import get_keys_with_label, convert_to_unit, rename_columns, add_Lw_from_Ed_Rrs
 
 folder = Path("data/TaraM/")
 files = list(folder.glob("Tara_HyperPro*.txt"))
 
-data = table.vstack([read(file, data_start=35) for file in files])
-
-header = read(files[0], data_start=32, data_end=33)
-header["col1"][0] = "year"
-header = header[0].as_void()
-
-for key, new_key in zip(data.keys(), header):
-    data.rename_column(key, new_key)
+data = table.vstack([read_seabass_table(file)[1] for file in files])
 
 data.remove_columns(get_keys_with_label(data, "sd"))
 data.remove_columns(get_keys_with_label(data, "LU"))
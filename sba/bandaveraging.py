@@ -3,16 +3,52 @@ Module with functions for band-averaging
 """
 
 import numpy as np
-from scipy.integrate import simps
+from scipy import sparse
+from scipy.special import erf
 import warnings
 
 
-def integrate(*args, **kwargs):
-    try:
-        result = simps(*args, **kwargs)
-    except IndexError:
-        result = 0.
+def composite_simpson_weights(x):
+    # Weights for Simpson's rule on an odd number of (irregularly spaced) points
+    weights = np.zeros(len(x))
+    steps = np.diff(x)
+    h0, h1 = steps[0::2], steps[1::2]
+    hsum = h0 + h1
+    weights[0:-2:2] += hsum / 6 * (2 - h1/h0)
+    weights[1::2] += hsum / 6 * hsum**2 / (h0 * h1)
+    weights[2::2] += hsum / 6 * (2 - h0/h1)
+    return weights
 
+
+def simpson_weights(x):
+    """
+    Quadrature weights w such that w @ y is the Simpson's rule integral of y
+    sampled at x. For an even number of points, the last interval is
+    included using Cartwright's correction, as in scipy.integrate.simpson.
+    Two points are integrated with the trapezoidal rule, and fewer than two
+    give an integral of 0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    weights = np.zeros(len(x))
+    if len(x) < 2:
+        return weights
+    elif len(x) == 2:
+        weights += (x[1] - x[0]) / 2
+    elif len(x) % 2 == 1:
+        weights += composite_simpson_weights(x)
+    else:
+        weights[:-1] += composite_simpson_weights(x[:-1])
+        h0, h1 = x[-2] - x[-3], x[-1] - x[-2]
+        weights[-1] += (2*h1**2 + 3*h1*h0) / (6 * (h0 + h1))
+        weights[-2] += (h1**2 + 3*h1*h0) / (6 * h0)
+        weights[-3] -= h1**3 / (6 * h0 * (h0 + h1))
+
+    return weights
+
+
+def integrate(y, x, axis=-1):
+    y = np.moveaxis(np.asarray(y, dtype=np.float64), axis, -1)
+    result = y @ simpson_weights(x)
     return result
 
 
@@ -55,6 +91,36 @@ def adjust_band_wavelengths(band_wavelengths, band_response, data_wavelengths):
     return new_wavelengths, new_response
 
 
+def nonzero_support(band_response):
+    """
+    Indices (first, end) of the part of a spectral response function that is
+    non-zero, including one zero on either side so the edges of the band
+    are kept intact.
+    """
+    nonzero = np.nonzero(band_response)[0]
+    if len(nonzero) == 0:
+        return 0, len(band_response)
+    first = max(nonzero[0] - 1, 0)
+    end = min(nonzero[-1] + 2, len(band_response))
+    return first, end
+
+
+def truncated_support(band_wavelengths, band_response, tolerance=1e-4):
+    """
+    Indices (first, end) of a spectral response function without its tails.
+    At most a fraction `tolerance` of the integrated (trapezoidal) response is
+    removed, half of it on either side, so the weight given to the removed
+    wavelengths in a band average is bounded by `tolerance`.
+    """
+    steps = 0.5 * (band_response[1:] + band_response[:-1]) * np.diff(band_wavelengths)
+    cumulative = np.concatenate([[0], np.cumsum(steps)])
+    total = cumulative[-1]
+
+    first = np.searchsorted(cumulative, tolerance/2 * total, side="right") - 1
+    last = np.searchsorted(cumulative, (1 - tolerance/2) * total, side="left")
+    return first, last+1
+
+
 def bandaverage(band_wavelengths, band_response, data_wavelengths, data_response):
     if not check_spectral_overlap(band_wavelengths, band_response, data_wavelengths):
         return nan_values(data_response)
@@ -83,6 +149,293 @@ def bandaverage_multi(band_wavelengths, band_response, data_wavelengths, data_re
     return response_average
 
 
+def wavelength_key(data_wavelengths):
+    # Hashable representation of a data wavelength grid, used to cache per-grid results
+    return np.asarray(data_wavelengths, dtype=np.float64).tobytes()
+
+
+def interpolation_matrix(band_wavelengths, data_wavelengths):
+    """
+    Matrix M such that M.T @ data_response is the linear interpolation of
+    `data_response` onto `band_wavelengths`. Only the rows for data points
+    that are used in the interpolation are returned, starting at index
+    `first`.
+    """
+    indices = np.searchsorted(data_wavelengths, band_wavelengths, side="right") - 1
+    indices = np.clip(indices, 0, len(data_wavelengths)-2)
+    fraction = (band_wavelengths - data_wavelengths[indices]) / (data_wavelengths[indices+1] - data_wavelengths[indices])
+
+    first = indices.min()
+    columns = np.arange(len(band_wavelengths))
+    matrix = np.zeros((indices.max() - first + 2, len(band_wavelengths)))
+    matrix[indices-first, columns] = 1 - fraction
+    matrix[indices-first+1, columns] += fraction
+    return first, matrix
+
+
+def convolution_weights(band_wavelengths, band_response, data_wavelengths):
+    """
+    Calculate the weights that turn a spectrum sampled at `data_wavelengths`
+    into its band average, so that band-averaging is a single dot product.
+    Returns the index of the first data point with a non-zero weight and the
+    weights themselves, or None if the band does not overlap the data (or
+    is empty, or has no response at all).
+    """
+    data_wavelengths = np.asarray(data_wavelengths, dtype=np.float64)
+    if len(band_wavelengths) == 0 or not np.any(band_response):
+        return None
+    if not check_spectral_overlap(band_wavelengths, band_response, data_wavelengths):
+        return None
+    else:
+        band_wavelengths, band_response = adjust_band_wavelengths(band_wavelengths, band_response, data_wavelengths)
+
+    first, matrix = interpolation_matrix(band_wavelengths, data_wavelengths)
+    quadrature = simpson_weights(band_wavelengths) * band_response
+    response_sum = matrix @ quadrature
+    weight_sum = quadrature.sum()
+    if weight_sum == 0:
+        return None
+    weights = response_sum / weight_sum
+
+    # Only keep the data points that contribute to the band average
+    nonzero = np.nonzero(weights)[0]
+    if len(nonzero) == 0:
+        return first, weights[:1]
+    weights = weights[nonzero[0]:nonzero[-1]+1]
+    return first + nonzero[0], weights
+
+
+def apply_convolution_weights(weights, data_response_multi):
+    data_response_multi = np.asarray(data_response_multi)
+    if weights is None:
+        return nan_values(data_response_multi)
+
+    first, weights = weights
+    data_relevant = data_response_multi[..., first:first+len(weights)]
+    response_average = data_relevant @ weights
+    return response_average
+
+
+def convolution_operator(weights_multi, number_of_wavelengths):
+    """
+    Combine the convolution weights of several bands into one sparse
+    (bands x data wavelengths) operator. Also returns a boolean array that is
+    True for bands that do not overlap the data.
+    """
+    no_overlap = np.array([weights is None for weights in weights_multi])
+    rows, columns, values = [], [], []
+    for i, weights in enumerate(weights_multi):
+        if weights is None:
+            continue
+        first, weights = weights
+        rows.append(np.full(len(weights), i))
+        columns.append(np.arange(first, first+len(weights)))
+        values.append(weights)
+
+    if len(values) > 0:
+        rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+    operator = sparse.csr_matrix((values, (rows, columns)), shape=(len(weights_multi), number_of_wavelengths))
+    return operator, no_overlap
+
+
+def apply_convolution_operator(operator, data_response_multi):
+    operator, no_overlap = operator
+    data_response_multi = np.asarray(data_response_multi, dtype=np.float64)
+    response_average = np.asarray(operator @ data_response_multi.T)
+    response_average[no_overlap] = np.nan
+    return response_average
+
+
+def cumulative_integral(data_wavelengths, data_response_multi):
+    """
+    Cumulative (trapezoidal) integral of each spectrum, starting from 0 at
+    the first data wavelength. This is the exact integral of the linearly
+    interpolated spectrum. Intervals next to NaN values count as 0, so a NaN
+    does not carry over to later wavelengths; `bandaverage_boxcar` sets the
+    bands that contain NaN values to NaN instead.
+    """
+    data_response_multi = np.asarray(data_response_multi, dtype=np.float64)
+    steps = 0.5 * (data_response_multi[..., 1:] + data_response_multi[..., :-1]) * np.diff(data_wavelengths)
+    steps[np.isnan(steps)] = 0
+    zeros = np.zeros_like(data_response_multi[..., :1])
+    cumulative = np.concatenate([zeros, np.cumsum(steps, axis=-1)], axis=-1)
+    return cumulative
+
+
+def interval_indices(wavelengths, data_wavelengths):
+    # Index of the data interval [x_i, x_i+1] that contains each of `wavelengths`
+    indices = np.searchsorted(data_wavelengths, wavelengths, side="right") - 1
+    return np.clip(indices, 0, len(data_wavelengths)-2)
+
+
+def evaluate_cumulative_integral(wavelengths, data_wavelengths, data_response_multi, cumulative):
+    # Integral of the linearly interpolated spectrum from the first data wavelength up to each of `wavelengths`
+    indices = interval_indices(wavelengths, data_wavelengths)
+    offset = wavelengths - data_wavelengths[indices]
+    slope = (data_response_multi[..., indices+1] - data_response_multi[..., indices]) / (data_wavelengths[indices+1] - data_wavelengths[indices])
+    integral = cumulative[..., indices] + data_response_multi[..., indices] * offset + 0.5 * slope * offset**2
+    return integral
+
+
+def bandaverage_boxcar(lower, upper, data_wavelengths, data_response_multi, cumulative=None, threshold=0.05):
+    """
+    Band-average spectra over boxcar bands from `lower` to `upper`, using the
+    closed form (C(upper) - C(lower)) / (upper - lower) where C is the
+    cumulative integral of the linearly interpolated spectrum. `lower` and
+    `upper` can be arrays of any (broadcastable) shape; the output has that
+    shape, followed by one axis for the spectra. `cumulative` can be passed
+    to re-use a pre-calculated `cumulative_integral`.
+
+    As in `bandaverage_multi`, bands of which more than `threshold` falls
+    outside the data are NaN, and other bands are trimmed to the data.
+    """
+    data_wavelengths = np.asarray(data_wavelengths, dtype=np.float64)
+    data_response_multi = np.atleast_2d(np.asarray(data_response_multi, dtype=np.float64))
+    if cumulative is None:
+        cumulative = cumulative_integral(data_wavelengths, data_response_multi)
+    cumulative = np.atleast_2d(cumulative)
+
+    lower, upper = np.broadcast_arrays(np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64))
+    shape = lower.shape
+    lower, upper = lower.ravel(), upper.ravel()
+
+    # Fraction of each band that falls outside the data
+    left, right = data_wavelengths[0], data_wavelengths[-1]
+    width = upper - lower
+    outside = np.clip(left - lower, 0, width) + np.clip(upper - right, 0, width)
+    no_overlap = outside > threshold * width
+
+    lower_trimmed, upper_trimmed = np.clip(lower, left, right), np.clip(upper, left, right)
+    integral_lower = evaluate_cumulative_integral(lower_trimmed, data_wavelengths, data_response_multi, cumulative)
+    integral_upper = evaluate_cumulative_integral(upper_trimmed, data_wavelengths, data_response_multi, cumulative)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        response_average = (integral_upper - integral_lower) / (upper_trimmed - lower_trimmed)
+    response_average[:, no_overlap] = np.nan
+
+    # Bands that use any NaN data point (from the interval containing `lower` to the one containing `upper`) are NaN
+    missing = np.isnan(data_response_multi)
+    if missing.any():
+        missing_cumulative = np.concatenate([np.zeros_like(missing[:, :1], dtype=np.int64), np.cumsum(missing, axis=-1)], axis=-1)
+        first, last = interval_indices(lower_trimmed, data_wavelengths), interval_indices(upper_trimmed, data_wavelengths) + 1
+        response_average[(missing_cumulative[:, last+1] - missing_cumulative[:, first]) > 0] = np.nan
+
+    response_average = response_average.T.reshape(*shape, len(data_response_multi))
+    return response_average
+
+
+def gaussian_weights(centers, fwhms, data_wavelengths, wavelength_range=(320, 800), threshold=0.05, truncate=5):
+    """
+    Convolution weights for Gaussian bands, calculated in closed form from the
+    integral of the Gaussian times the linearly interpolated spectrum.
+    `centers` and `fwhms` can be arrays of any (broadcastable) shape; the
+    output has that shape, followed by one axis for the data wavelengths.
+
+    Like the bands from `generate_gaussian`, the Gaussians only extend over
+    `wavelength_range` and within `truncate` sigma of the center, so data
+    points outside that support have a weight of exactly 0. Bands of which
+    more than `threshold` falls outside the data have NaN weights. Apply the
+    weights with `apply_weights` so NaN data only affect the bands that use
+    them.
+    """
+    data_wavelengths = np.asarray(data_wavelengths, dtype=np.float64)
+    centers, fwhms = np.broadcast_arrays(np.asarray(centers, dtype=np.float64), np.asarray(fwhms, dtype=np.float64))
+    shape = centers.shape
+    centers = centers.ravel()[:, np.newaxis]
+    sigmas = fwhms.ravel()[:, np.newaxis] / 2.355
+
+    def antiderivative(wavelengths):
+        return sigmas * np.sqrt(np.pi/2) * erf((wavelengths - centers) / (np.sqrt(2) * sigmas))
+
+    def gaussian(wavelengths):
+        return np.exp(-(wavelengths - centers)**2 / (2 * sigmas**2))
+
+    # Support of each band
+    band_left, band_right = np.full_like(centers, wavelength_range[0]), np.full_like(centers, wavelength_range[1])
+    if truncate is not None:
+        band_left, band_right = np.maximum(band_left, centers - truncate * sigmas), np.minimum(band_right, centers + truncate * sigmas)
+
+    # Integrate over each data interval, trimmed to the range shared by the band and the data
+    left, right = np.maximum(band_left, data_wavelengths[0]), np.minimum(band_right, data_wavelengths[-1])
+    lower, upper = np.clip(data_wavelengths[:-1], left, right), np.clip(data_wavelengths[1:], left, right)
+    integral = antiderivative(upper) - antiderivative(lower)
+    first_moment = (centers - data_wavelengths[:-1]) * integral - sigmas**2 * (gaussian(upper) - gaussian(lower))
+    steps = np.diff(data_wavelengths)
+
+    # Distribute each interval over the data points on either side
+    weights = np.zeros((len(centers), len(data_wavelengths)))
+    weights[:, 1:] += first_moment / steps
+    weights[:, :-1] += integral - first_moment / steps
+
+    integral_data = integral.sum(axis=1)
+    integral_full = (antiderivative(band_right) - antiderivative(band_left))[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights /= integral_data[:, np.newaxis]
+    weights[integral_full - integral_data > threshold * integral_full] = np.nan
+
+    weights = weights.reshape(*shape, len(data_wavelengths))
+    return weights
+
+
+def apply_weights(weights, data_response_multi):
+    """
+    Apply dense convolution weights (bands x data wavelengths) to spectra
+    (spectra x data wavelengths), like `weights @ data.T`, except that a NaN
+    in the data only makes the bands with a non-zero weight for it NaN,
+    rather than every band (through 0 * NaN).
+    """
+    missing = np.isnan(data_response_multi)
+    result = weights @ np.where(missing, 0, data_response_multi).T
+    if missing.any():
+        affected = (weights != 0).astype(np.float64) @ missing.T.astype(np.float64) > 0
+        result[affected] = np.nan
+    return result
+
+
+def convolve_reflectance_radiance(convolve, Ed, Lw, R_rs):
+    """
+    Band-average data in reflectance space (R_rs directly) and in radiance
+    space (Lw and Ed separately, then divided). The three quantities are
+    stacked and passed through `convolve` together, in a single call.
+    Returns the reflectance-space and radiance-space results and the
+    absolute and relative differences between them.
+    """
+    data_combined = np.concatenate([np.atleast_2d(R_rs), np.atleast_2d(Lw), np.atleast_2d(Ed)])
+    R_rs_average, Lw_average, Ed_average = np.split(convolve(data_combined), 3, axis=-1)
+
+    reflectance_space = R_rs_average
+    radiance_space = Lw_average / Ed_average
+    difference_absolute, difference_relative = calculate_differences(reflectance_space, radiance_space)
+
+    return reflectance_space, radiance_space, difference_absolute, difference_relative
+
+
+def convolve_reflectance_radiance_chunks(convolve, chunks, n_wavelengths):
+    """
+    Like `convolve_reflectance_radiance`, for an iterable of (Ed, Lw, R_rs)
+    chunks, e.g. from `sba.io.iterate_data_file`. Only one chunk of input
+    data is in memory at a time; the results are concatenated. If there are
+    no chunks, the results are empty arrays with the right number of bands,
+    for which the number of data wavelengths `n_wavelengths` is needed.
+    """
+    results = [convolve_reflectance_radiance(convolve, *chunk) for chunk in chunks]
+    if len(results) == 0:
+        empty = np.empty((0, n_wavelengths))
+        return convolve_reflectance_radiance(convolve, empty, empty, empty)
+    results = tuple(np.concatenate(result, axis=-1) for result in zip(*results))
+    return results
+
+
+def apply_in_chunks(function, data_response_multi, n_wavelengths):
+    # Apply `function` to an array of spectra, or to each chunk from an iterator of arrays
+    # (an empty iterator gives an empty result, from `n_wavelengths` data wavelengths)
+    if hasattr(data_response_multi, "__len__"):
+        return function(data_response_multi)
+    results = [function(chunk) for chunk in data_response_multi]
+    if len(results) == 0:
+        return function(np.empty((0, n_wavelengths)))
+    return np.concatenate(results, axis=-1)
+
+
 def calculate_differences(reflectance_space, radiance_space):
     difference_absolute = reflectance_space - radiance_space
     with warnings.catch_warnings():
@@ -1,16 +1,39 @@
 import numpy as np
+import threading
 
 from .response_curves import load_SeaWiFS, load_MERIS, load_MODISA, load_VIIRS, load_CZCS, load_Sentinel2A, load_SPECTACLE, load_OLI
 
 
+# Most recent convolution result per sensor, so algorithms for the same sensor (e.g. OC6M and OC3M) can share it
+convolution_results = {}
+convolution_results_lock = threading.Lock()
+
+
+def band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs):
+    """
+    Band-average data with `sensor` in reflectance and radiance space. If the
+    same sensor was last applied to the same arrays (the same objects, so
+    changes made in-place are not detected), the previous result is re-used.
+    """
+    data = (wavelengths, Ed, Lw, R_rs)
+    with convolution_results_lock:
+        previous = convolution_results.get(sensor.name)
+    if previous is not None and previous[0] is sensor and all(new is old for new, old in zip(data, previous[1])):
+        return previous[2]
+
+    result = sensor.band_average_reflectance_radiance(*data)
+    with convolution_results_lock:
+        convolution_results[sensor.name] = (sensor, data, result)
+    return result
+
+
 def KT16_algorithm(B4, B5, B6):
     return 2231 * (B5 - (B4 + B6)/2) + 12.7
 
 
 def KT16(wavelengths, Ed, Lw, R_rs):
     sensor = load_Sentinel2A()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     chl_R = KT16_algorithm(*reflectance_space[3:6])
     chl_L = KT16_algorithm(*radiance_space[3:6])
@@ -24,8 +47,7 @@ def Ha17_algorithm(B3, B4):
 
 def Ha17(wavelengths, Ed, Lw, R_rs):
     sensor = load_Sentinel2A()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     chl_R = Ha17_algorithm(reflectance_space[2], reflectance_space[3])
     chl_L = Ha17_algorithm(radiance_space[2], radiance_space[3])
@@ -43,8 +65,7 @@ def OCx(R_rs_blue, R_rs_green, a):
 
 def OC4(wavelengths, Ed, Lw, R_rs):
     sensor = load_SeaWiFS()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([0.32814, -3.20725, 3.22969, -1.36769, -0.81739])
     blue_R = np.max(reflectance_space[1:4], axis=0)
@@ -59,8 +80,7 @@ def OC4(wavelengths, Ed, Lw, R_rs):
 
 def OC4E(wavelengths, Ed, Lw, R_rs):
     sensor = load_MERIS()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([0.42487, -3.20974, 2.89721, -0.75258, -0.98259])
     blue_R = np.max(reflectance_space[1:4], axis=0)
@@ -75,8 +95,7 @@ def OC4E(wavelengths, Ed, Lw, R_rs):
 
 def OC6M(wavelengths, Ed, Lw, R_rs):
     sensor = load_MODISA()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([1.22914, -4.99423, 5.64706, -3.53426, 0.69266])
     blue_R = np.max(reflectance_space[[0,1,3,4]], axis=0)
@@ -91,8 +110,7 @@ def OC6M(wavelengths, Ed, Lw, R_rs):
 
 def OC3M(wavelengths, Ed, Lw, R_rs):
     sensor = load_MODISA()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([0.26294, -2.64669, 1.28364, 1.08209, -1.76828])
     blue_R = np.max(reflectance_space[1:4:2], axis=0)
@@ -107,8 +125,7 @@ def OC3M(wavelengths, Ed, Lw, R_rs):
 
 def OC3V(wavelengths, Ed, Lw, R_rs):
     sensor = load_VIIRS()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([0.23548, -2.63001, 1.65498, 0.16117, -1.37247])
     blue_R = np.max(reflectance_space[1:3], axis=0)
@@ -123,8 +140,7 @@ def OC3V(wavelengths, Ed, Lw, R_rs):
 
 def OC3C(wavelengths, Ed, Lw, R_rs):
     sensor = load_CZCS()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     a = np.array([0.31841, -4.56386, 8.63979, -8.41411, 1.91532])
     blue_R = np.max(reflectance_space[:2], axis=0)
@@ -143,8 +159,7 @@ def GM09_algorithm(B, G):
 
 def GM09(wavelengths, Ed, Lw, R_rs):
     sensor = load_SPECTACLE()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     chl_R = GM09_algorithm(reflectance_space[5], reflectance_space[4])
     chl_L = GM09_algorithm(radiance_space[5], radiance_space[4])
@@ -159,8 +174,7 @@ def HydroColor_algorithm(red):
 
 def HydroColor(wavelengths, Ed, Lw, R_rs):
     sensor = load_SPECTACLE()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     turb_R = HydroColor_algorithm(reflectance_space[3])
     turb_L = HydroColor_algorithm(radiance_space[3])
@@ -175,8 +189,7 @@ def Lymburner16_algorithm(green, red):
 
 def Lymburner16(wavelengths, Ed, Lw, R_rs):
     sensor = load_OLI()
-    reflectance_space = sensor.band_average(wavelengths, R_rs)
-    radiance_space = sensor.band_average(wavelengths, Lw) / sensor.band_average(wavelengths, Ed)
+    reflectance_space, radiance_space, *_ = band_average_reflectance_radiance(sensor, wavelengths, Ed, Lw, R_rs)
 
     tsm_R = Lymburner16_algorithm(reflectance_space[2], reflectance_space[3])
     tsm_L = Lymburner16_algorithm(radiance_space[2], radiance_space[3])
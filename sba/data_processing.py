@@ -5,20 +5,95 @@ to clean spectra
 
 import numpy as np
 import operator as op
+import re
+from copy import deepcopy
+from functools import lru_cache
 from astropy import table
+from astropy import units as u
 
 
 comparators = {">": op.gt, ">=": op.ge, "==": op.eq, "<": op.lt, "<=": op.le}
 
 
+def record_qc(data, description):
+    # Keep track of the QC filters applied to a table, for the manifest
+    data.meta.setdefault("qc", []).append(description)
+
+
+# Spectral columns are named {quantity}_{wavelength}, optionally followed by " [unit]", e.g. "R_rs_412.5"
+spectral_column_pattern = re.compile(r"^(?P<quantity>.+?)_(?P<wavelength>\d+(?:\.\d*)?)(?: \[(?P<unit>[^\]]*)\])?$")
+minimum_wavelength = 100  # nm; suffixes like _1 and _2 from table joins are not wavelengths
+
+
+class SpectralSchema(object):
+    """
+    The spectral columns of a table, parsed once from the column names into
+    (quantity, wavelength, unit) and grouped per quantity, e.g. "Ed" or
+    "R_rs". Use `get_schema` rather than creating these directly, so the
+    parsing is cached and follows the columns as they are added or removed.
+    """
+    def __init__(self, colnames):
+        self.colnames = tuple(colnames)
+        columns = {}
+        for index, key in enumerate(self.colnames):
+            match = spectral_column_pattern.match(key)
+            if match is not None and float(match["wavelength"]) >= minimum_wavelength:
+                columns.setdefault(match["quantity"], []).append((index, float(match["wavelength"]), match["unit"]))
+
+        self._indices = {quantity: np.array([index for index, wavelength, unit in block]) for quantity, block in columns.items()}
+        self._wavelengths = {quantity: np.array([wavelength for index, wavelength, unit in block]) for quantity, block in columns.items()}
+        self._units = {quantity: [unit for index, wavelength, unit in block] for quantity, block in columns.items()}
+        for array in [*self._indices.values(), *self._wavelengths.values()]:
+            array.flags.writeable = False  # Shared between all tables with these columns
+
+    def __repr__(self):
+        return f"SpectralSchema ({', '.join(f'{quantity}: {len(indices)}' for quantity, indices in self._indices.items())})"
+
+    def __contains__(self, quantity):
+        return quantity in self._indices
+
+    @property
+    def quantities(self):
+        return list(self._indices.keys())
+
+    def indices(self, quantity):
+        # Column indices of `quantity`, in table order
+        return self._indices[quantity]
+
+    def keys(self, quantity):
+        return [self.colnames[index] for index in self._indices[quantity]]
+
+    def wavelengths(self, quantity):
+        return self._wavelengths[quantity]
+
+    def units(self, quantity):
+        # Units given in the column names, None where there are none
+        return self._units[quantity]
+
+
+@lru_cache(maxsize=256)
+def parse_schema(colnames):
+    return SpectralSchema(colnames)
+
+
+def get_schema(data):
+    return parse_schema(tuple(data.colnames))
+
+
+def filter_keys(keys, label, exclude="sd"):
+    return [key for key in keys if (label in key and exclude not in key)]
+
+
 def get_keys_with_label(data, *labels, exclude="sd"):
     """
     Get the keys (column names) in an AstroPy table that contain a phrase
     `label`. Any number of labels can be given. The output will contain the
     list for each. If only one label is given, the output is a single list;
-    otherwise, it is a list of lists.
+    otherwise, it is a list of lists. Labels that are spectral quantities
+    (see `SpectralSchema`) give exactly the columns of that quantity.
     """
-    keys = [[key for key in data.keys() if (label in key and exclude not in key)] for label in labels]
+    schema = get_schema(data)
+    keys = [schema.keys(label) if label in schema else filter_keys(data.keys(), label, exclude=exclude) for label in labels]
     if len(labels) == 1:  # If only one label is given, return one list
         return keys[0]
     else:  #
@@ -26,25 +101,62 @@ def get_keys_with_label(data, *labels, exclude="sd"):
 
 
 def split_spectrum(data_table, label):
-    keys_relevant = get_keys_with_label(data_table, label)
-    wavelengths = np.array([float(key.split("_")[-1]) for key in keys_relevant])
-    try:
-        spectra = np.array([data_table[key]._data for key in keys_relevant]).T
-    except AttributeError:
-        spectra = np.array([data_table[key].data for key in keys_relevant]).T
+    if isinstance(data_table, SpectralTable):
+        return data_table.wavelengths[label], data_table.spectra[label]
+
+    schema = get_schema(data_table)
+    if label in schema:
+        keys_relevant = schema.keys(label)
+        wavelengths = schema.wavelengths(label).copy()
+    else:
+        keys_relevant = get_keys_with_label(data_table, label)
+        wavelengths = np.array([float(key.split("_")[-1]) for key in keys_relevant])
+    # Missing (masked) values are NaN, as in `sba.io.iterate_data_file`
+    spectra = np.array([np.ma.filled(np.ma.array(data_table[key], dtype=np.float64), np.nan) for key in keys_relevant]).T
     return wavelengths, spectra
 
 
+def get_conversion_factor(unit_old, unit_new=None):
+    # Scale factor from `unit_old` to `unit_new` (1 if there is no new unit)
+    if unit_new is None:
+        return 1.
+    return u.Unit(unit_old).to(unit_new)
+
+
+def scale_column(data, key, factor, unit):
+    # Multiply a column by `factor` in place (floating-point columns) and set its unit
+    column = data[key]
+    if factor != 1:
+        if column.dtype.kind == "f":
+            column *= factor
+        else:
+            data[key] = column.astype(np.float64) * factor
+            column = data[key]
+    column.unit = unit
+
+
 def convert_to_unit_single(data, key, unit_old="", unit_new=None):
-    data[key].unit = unit_old
-    if unit_new is not None:
-        data[key] = data[key].to(unit_new)
+    factor = get_conversion_factor(unit_old, unit_new)
+    scale_column(data, key, factor, unit_old if unit_new is None else unit_new)
 
 
 def convert_to_unit(data, label, unit_old="", unit_new=None):
-    keys = get_keys_with_label(data, label)
-    for key in keys:
-        convert_to_unit_single(data, key, unit_old=unit_old, unit_new=unit_new)
+    """
+    Set the unit of all columns of `label` to `unit_old` and, if given,
+    convert them to `unit_new`. The conversion factor is calculated once and
+    applied to each column in place. For a SpectralTable, the whole block
+    is converted at once and the unit is kept per quantity.
+    """
+    if isinstance(data, SpectralTable):
+        data.units[label] = u.Unit(unit_old)
+        if unit_new is not None:
+            data.convert_to_unit(label, unit_new)
+        return
+
+    factor = get_conversion_factor(unit_old, unit_new)
+    unit = unit_old if unit_new is None else unit_new
+    for key in get_keys_with_label(data, label):
+        scale_column(data, key, factor, unit)
 
 
 def rename_columns(data, label_old, label_new, strip=False, **kwargs):
@@ -62,6 +174,11 @@ def add_Lw_from_Ed_Rrs(data, Ed_label="Ed", R_rs_label="R_rs"):
 
     Lw = Ed * R_rs
 
+    if isinstance(data, SpectralTable):
+        Lw_keys = [key.replace("Ed", "Lw") for key in data.keys[Ed_label]]
+        data.add_quantity(Ed_label.replace("Ed", "Lw"), wavelengths, Lw, unit=data.units[Ed_label] * data.units[R_rs_label], keys=Lw_keys)
+        return data
+
     Ed_keys, R_rs_keys = get_keys_with_label(data, Ed_label, R_rs_label)
     Lw_keys = [key.replace("Ed", "Lw") for key in Ed_keys]
 
@@ -74,22 +191,403 @@ def add_Lw_from_Ed_Rrs(data, Ed_label="Ed", R_rs_label="R_rs"):
     return data
 
 def clip_to_zero(data, threshold=-1e-4):
+    if isinstance(data, SpectralTable):
+        clip = (data.spectra["R_rs"] < 0) & (data.spectra["R_rs"] > threshold)
+        data.spectra["R_rs"][clip] = 0
+        data.spectra["Lw"][clip] = 0
+        record_qc(data, f"R_rs in ({threshold}, 0) clipped to 0")
+        return
+
     Lw_keys, R_rs_keys = get_keys_with_label(data, "Lw", "R_rs")
     for Lw_k, R_rs_k in zip(Lw_keys, R_rs_keys):
         ind = np.where((data[R_rs_k] < 0) & (data[R_rs_k] > threshold))
         data[R_rs_k][ind] = 0
         data[Lw_k][ind] = 0
+    record_qc(data, f"R_rs in ({threshold}, 0) clipped to 0")
+
+
+def get_block(data, keys):
+    """
+    Get the columns `keys` of a table as one (N x len(keys)) masked array,
+    so rows can be checked in NumPy rather than one at a time.
+    """
+    return np.ma.column_stack([np.ma.asarray(data[key]) for key in keys]) if len(keys) > 0 else np.ma.zeros((len(data), 0))
+
 
+def get_quantity_block(data, quantity):
+    # All values of `quantity`, from an astropy Table or a SpectralTable
+    if isinstance(data, SpectralTable):
+        return np.ma.asarray(data.spectra[quantity])
+    return get_block(data, get_keys_with_label(data, quantity))
 
-def remove_rows_based_on_threshold(data, quantity, comparator, threshold, quiet=False):
+
+def threshold_mask(data, quantity, comparator, threshold):
+    # Rows where any value of `quantity` meets the condition; masked values never do
     operator = comparators[comparator]
-    keys = get_keys_with_label(data, quantity)
-    remove_indices = [i for i, row in enumerate(data) if any(operator(row[key], threshold) for key in keys)]
-    data.remove_rows(remove_indices)
+    block = get_quantity_block(data, quantity)
+    return np.ma.filled(operator(block, threshold), False).any(axis=1)
+
+
+def missing_mask(data, quantity):
+    # Rows where any value of `quantity` is masked or NaN
+    block = get_quantity_block(data, quantity)
+    return (np.ma.getmaskarray(block) | np.isnan(np.ma.getdata(block))).any(axis=1)
+
+
+class RowFilter(object):
+    """
+    Deferred row removal for a table (astropy Table or SpectralTable). QC
+    steps that are given a `row_filter` only mark rows for removal, with a
+    reason code (the index of the step, counting from 1; 0 means kept).
+    `apply` then removes all marked rows in one go. Each row is counted
+    against the first step that rejected it, as if the rows had been
+    removed step by step.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.keep = np.ones(len(data), dtype=bool)
+        self.reasons = np.zeros(len(data), dtype=np.int16)
+        self.descriptions = []
+        self.counts = []
+
+    def __repr__(self):
+        return f"RowFilter ({len(self.descriptions)} steps, {np.count_nonzero(~self.keep)}/{len(self.keep)} rows rejected)"
+
+    def reject(self, mask, description):
+        # Mark the rows where `mask` is True for removal; returns the number of newly rejected rows
+        mask = np.ma.filled(mask, False)
+        new = mask & self.keep
+        self.keep &= ~mask
+        self.descriptions.append(description)
+        self.reasons[new] = len(self.descriptions)
+        self.counts.append(int(np.count_nonzero(new)))
+        return self.counts[-1]
+
+    def report(self):
+        # Number of rows rejected by each step, as a dictionary {description: count}
+        return dict(zip(self.descriptions, self.counts))
+
+    def apply(self, quiet=False):
+        # Remove all rejected rows from the table at once
+        remove_indices = np.where(~self.keep)[0]
+        self.data.remove_rows(remove_indices)
+        if not quiet:
+            print(f"Removed {len(remove_indices)} rows in total")
+        return self.data
+
+
+def remove_rows_with_mask(data, mask, description, quiet=False, row_filter=None):
+    """
+    Remove the rows where the boolean `mask` is True in one go, and record
+    this as a QC step. `description` completes the sentence "Removed N rows
+    with ...". If a `row_filter` (see `RowFilter`) is given, the rows are
+    only marked, to be removed later by `row_filter.apply`.
+    """
+    record_qc(data, f"Removed rows with {description}")
+    if row_filter is not None:
+        number_removed = row_filter.reject(mask, description)
+    else:
+        remove_indices = np.where(np.ma.filled(mask, False))[0]
+        data.remove_rows(remove_indices)
+        number_removed = len(remove_indices)
     if not quiet:
-        print(f"Removed {len(remove_indices)} rows with {quantity} {comparator} {threshold}")
+        print(f"Removed {number_removed} rows with {description}")
+
+
+def remove_rows_based_on_threshold(data, quantity, comparator, threshold, quiet=False, row_filter=None):
+    mask = threshold_mask(data, quantity, comparator, threshold)
+    remove_rows_with_mask(data, mask, f"{quantity} {comparator} {threshold}", quiet=quiet, row_filter=row_filter)
+
+
+def remove_rows_with_missing_values(data, quantity, quiet=False, row_filter=None):
+    mask = missing_mask(data, quantity)
+    remove_rows_with_mask(data, mask, f"missing {quantity} values", quiet=quiet, row_filter=row_filter)
 
 
 def remove_negative_R_rs(data, clip=-1e-4, **kwargs):
     clip_to_zero(data, threshold=clip)
     remove_rows_based_on_threshold(data, "R_rs", "<", 0, **kwargs)
+
+
+def format_key(quantity, wavelength):
+    # Column name for one wavelength of a quantity, e.g. "R_rs_412.5"
+    return f"{quantity}_{wavelength:g}"
+
+
+def get_column_info(column):
+    # Attributes of a table column that `SpectralTable` restores in `to_table`
+    return {"unit": column.unit, "description": column.description, "format": column.format, "meta": deepcopy(column.meta), "masked": hasattr(column, "mask")}
+
+
+def make_column(values, name, info, mask, unit=None):
+    # Column with the attributes from `get_column_info`; `mask` is only used for columns that were masked
+    if info.get("masked", False):
+        column = table.MaskedColumn(np.ma.getdata(values), name=name, mask=mask, unit=unit)
+    else:
+        column = table.Column(np.ma.getdata(values), name=name, unit=unit)
+    column.description, column.format, column.meta = info.get("description"), info.get("format"), deepcopy(info.get("meta", {}))
+    return column
+
+
+class SpectralTable(object):
+    """
+    Spectral data set kept as arrays: one contiguous (N x wavelengths) float
+    block per quantity (e.g. Ed, Lw, R_rs), each with its wavelengths and
+    unit, and a structured array with the other (metadata) columns. Row
+    filtering, unit conversion and derived quantities work on whole blocks
+    at once. Missing spectral values are NaN. Use `from_table` and
+    `to_table` to convert from/to an astropy Table for input and output;
+    the original column names, order, descriptions, formats and masks are
+    kept for the round trip.
+    """
+    def __init__(self, metadata, meta=None, colnames=(), column_info=None):
+        self.metadata = metadata
+        self.spectra = {}
+        self.wavelengths = {}
+        self.units = {}
+        self.keys = {}
+        self.meta = deepcopy(meta) if meta is not None else {}
+        self.colnames = tuple(colnames)  # Column order of the original table
+        self.column_info = column_info if column_info is not None else {}  # By column name, see `get_column_info`
+
+    @classmethod
+    def from_table(cls, data):
+        schema = get_schema(data)
+        spectral_keys = {key for quantity in schema.quantities for key in schema.keys(quantity)}
+        metadata_keys = [key for key in data.colnames if key not in spectral_keys]
+        metadata = data[metadata_keys].as_array() if len(metadata_keys) > 0 else np.empty(len(data), dtype=[])
+
+        column_info = {key: get_column_info(data[key]) for key in data.colnames}
+        spectral_table = cls(metadata, meta=data.meta, colnames=data.colnames, column_info=column_info)
+        for quantity in schema.quantities:
+            keys = schema.keys(quantity)
+            unit = data[keys[0]].unit
+            columns = [data[key] if data[key].unit == unit else data[key].to(unit) for key in keys]
+            spectra = np.ma.filled(np.ma.column_stack([np.ma.asarray(column, dtype=np.float64) for column in columns]), np.nan)
+            spectral_table.add_quantity(quantity, schema.wavelengths(quantity), spectra, unit=unit, keys=keys)
+        return spectral_table
+
+    def to_table(self):
+        metadata_info = {key: self.column_info.get(key, {"masked": np.ma.isMaskedArray(self.metadata)}) for key in self.metadata.dtype.names or ()}
+        columns = [make_column(self.metadata[key], key, info, np.ma.getmaskarray(self.metadata[key]), unit=info.get("unit")) for key, info in metadata_info.items()]
+        columns += [make_column(spectra[:,i], key, self.column_info.get(key, {}), np.isnan(spectra[:,i]), unit=self.units[quantity]) for quantity, spectra in self.spectra.items() for i, key in enumerate(self.keys[quantity])]
+        data = table.Table(columns, meta=self.meta)
+
+        # Original columns in their original order, followed by new ones
+        original = [key for key in self.colnames if key in data.colnames]
+        return data[original + [key for key in data.colnames if key not in set(original)]]
+
+    def __repr__(self):
+        return f"SpectralTable ({len(self)} rows; {', '.join(f'{quantity}: {len(wavelengths)} wavelengths' for quantity, wavelengths in self.wavelengths.items())})"
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def quantities(self):
+        return list(self.spectra.keys())
+
+    def add_quantity(self, quantity, wavelengths, spectra, unit=None, keys=None):
+        """
+        Add (or replace) the spectra of `quantity`. `keys` are the column
+        names for `to_table`; by default, those of the quantity being
+        replaced are kept if the wavelengths are the same, and otherwise
+        they are made with `format_key`.
+        """
+        spectra = np.ascontiguousarray(spectra, dtype=np.float64)
+        wavelengths = np.array(wavelengths, dtype=np.float64)
+        if spectra.shape != (len(self), len(wavelengths)):
+            raise ValueError(f"Spectra for {quantity} have shape {spectra.shape}, expected {(len(self), len(wavelengths))}")
+        if keys is None:
+            if quantity in self.keys and np.array_equal(self.wavelengths[quantity], wavelengths):
+                keys = self.keys[quantity]
+            else:
+                keys = [format_key(quantity, wavelength) for wavelength in wavelengths]
+        self.spectra[quantity] = spectra
+        self.wavelengths[quantity] = wavelengths
+        self.units[quantity] = unit
+        self.keys[quantity] = list(keys)
+
+    def remove_quantity(self, quantity):
+        for attribute in [self.spectra, self.wavelengths, self.units, self.keys]:
+            del attribute[quantity]
+
+    def __getitem__(self, rows):
+        # A new SpectralTable with only the given rows (slice, indices or boolean mask)
+        spectral_table = SpectralTable(self.metadata[rows], meta=self.meta, colnames=self.colnames, column_info=self.column_info)
+        for quantity in self.quantities:
+            spectral_table.add_quantity(quantity, self.wavelengths[quantity], self.spectra[quantity][rows], unit=self.units[quantity], keys=self.keys[quantity])
+        return spectral_table
+
+    def keep_rows(self, keep):
+        # Keep only the rows where the boolean `keep` is True, in place
+        self.metadata = self.metadata[keep]
+        for quantity in self.quantities:
+            self.spectra[quantity] = self.spectra[quantity][keep]
+
+    def remove_rows(self, indices):
+        # Same as astropy.table.Table.remove_rows, so the QC functions work on both
+        keep = np.ones(len(self), dtype=bool)
+        keep[indices] = False
+        self.keep_rows(keep)
+
+    def crop_wavelengths(self, minimum, maximum):
+        # Keep only the wavelengths between `minimum` and `maximum` (inclusive), for every quantity
+        for quantity in self.quantities:
+            keep = (self.wavelengths[quantity] >= minimum) & (self.wavelengths[quantity] <= maximum)
+            self.spectra[quantity] = np.ascontiguousarray(self.spectra[quantity][:,keep])
+            self.wavelengths[quantity] = self.wavelengths[quantity][keep]
+            self.keys[quantity] = [key for key, kept in zip(self.keys[quantity], keep) if kept]
+
+    def convert_to_unit(self, quantity, unit_new):
+        factor = get_conversion_factor(self.units[quantity], unit_new)
+        if factor != 1:
+            self.spectra[quantity] *= factor
+        self.units[quantity] = u.Unit(unit_new)
+
+
+class QCStep(object):
+    """
+    One step in a `QCPipeline`. Steps act on a SpectralTable; steps that
+    reject rows only mark them in the pipeline's RowFilter.
+    """
+    def __call__(self, data, row_filter, quiet=False):
+        raise NotImplementedError
+
+
+class MissingValues(QCStep):
+    def __init__(self, quantity):
+        self.quantity = quantity
+
+    def __call__(self, data, row_filter, quiet=False):
+        remove_rows_with_missing_values(data, self.quantity, quiet=quiet, row_filter=row_filter)
+
+
+class Threshold(QCStep):
+    """
+    Reject rows where any value of `quantity` meets the condition, e.g.
+    Threshold("R_rs", ">", 0.8). If `statistic` ("min", "max" or "mean") is
+    given, the condition applies to that statistic of each spectrum instead;
+    as in the original per-script QC, a spectrum with any missing (NaN)
+    value has a NaN statistic and is not rejected by it.
+    """
+    statistics = {"min": np.min, "max": np.max, "mean": np.mean}
+
+    def __init__(self, quantity, comparator, threshold, statistic=None):
+        self.quantity = quantity
+        self.comparator = comparator
+        self.threshold = threshold
+        self.statistic = statistic
+
+    def __call__(self, data, row_filter, quiet=False):
+        if self.statistic is None:
+            remove_rows_based_on_threshold(data, self.quantity, self.comparator, self.threshold, quiet=quiet, row_filter=row_filter)
+            return
+
+        values = self.statistics[self.statistic](data.spectra[self.quantity], axis=1)
+        mask = comparators[self.comparator](values, self.threshold)
+        remove_rows_with_mask(data, mask, f"{self.statistic}({self.quantity}) {self.comparator} {self.threshold}", quiet=quiet, row_filter=row_filter)
+
+
+class BandDifference(QCStep):
+    # Reject rows where quantity(wavelength_1) - quantity(wavelength_2) meets the condition
+    def __init__(self, quantity, wavelength_1, wavelength_2, comparator, threshold):
+        self.quantity = quantity
+        self.wavelengths = (wavelength_1, wavelength_2)
+        self.comparator = comparator
+        self.threshold = threshold
+
+    def __call__(self, data, row_filter, quiet=False):
+        index_1, index_2 = [np.where(data.wavelengths[self.quantity] == wavelength)[0][0] for wavelength in self.wavelengths]
+        difference = data.spectra[self.quantity][:,index_1] - data.spectra[self.quantity][:,index_2]
+        mask = comparators[self.comparator](difference, self.threshold)
+        remove_rows_with_mask(data, mask, f"{self.quantity}({self.wavelengths[0]:g} nm) - {self.quantity}({self.wavelengths[1]:g} nm) {self.comparator} {self.threshold}", quiet=quiet, row_filter=row_filter)
+
+
+class Jumps(QCStep):
+    """
+    Reject rows with jumps >= `threshold` (absolute difference) in `quantity`
+    between neighbouring wavelengths. If `consecutive` is True, only two
+    such jumps in a row count, e.g. a single-wavelength spike.
+    """
+    def __init__(self, quantity, threshold, consecutive=False):
+        self.quantity = quantity
+        self.threshold = threshold
+        self.consecutive = consecutive
+
+    def __call__(self, data, row_filter, quiet=False):
+        jumps = np.abs(np.diff(data.spectra[self.quantity], axis=1)) >= self.threshold
+        if self.consecutive:
+            jumps = jumps[:,:-1] & jumps[:,1:]
+        description = f"{'consecutive ' if self.consecutive else ''}{self.quantity} jumps >= {self.threshold}"
+        remove_rows_with_mask(data, jumps.any(axis=1), description, quiet=quiet, row_filter=row_filter)
+
+
+class SubtractBand(QCStep):
+    """
+    Normalise `quantity` by subtracting its value at `wavelength` from each
+    spectrum, e.g. R_rs(750 nm) for SO-P4. Lw is then re-calculated as
+    R_rs * Ed if `quantity` is R_rs.
+    """
+    def __init__(self, wavelength, quantity="R_rs"):
+        self.wavelength = wavelength
+        self.quantity = quantity
+
+    def __call__(self, data, row_filter, quiet=False):
+        index = np.where(data.wavelengths[self.quantity] == self.wavelength)[0][0]
+        data.spectra[self.quantity] -= data.spectra[self.quantity][:,index,np.newaxis]
+        if self.quantity == "R_rs" and "Ed" in data.spectra:
+            Lw_keys = [key.replace("Ed", "Lw") for key in data.keys["Ed"]]
+            data.add_quantity("Lw", data.wavelengths["Ed"], data.spectra["R_rs"] * data.spectra["Ed"], unit=data.units["R_rs"] * data.units["Ed"], keys=Lw_keys)
+        record_qc(data, f"Subtracted {self.quantity}({self.wavelength:g} nm)")
+
+
+class ClipToZero(QCStep):
+    def __init__(self, threshold=-1e-4):
+        self.threshold = threshold
+
+    def __call__(self, data, row_filter, quiet=False):
+        clip_to_zero(data, threshold=self.threshold)
+
+
+class CropWavelengths(QCStep):
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __call__(self, data, row_filter, quiet=False):
+        data.crop_wavelengths(self.minimum, self.maximum)
+        record_qc(data, f"Cropped to {self.minimum}-{self.maximum} nm")
+        if not quiet:
+            print(f"Removed columns with wavelengths <{self.minimum} and >{self.maximum}")
+
+
+class QCPipeline(object):
+    """
+    Quality control as a list of declared steps (see the QCStep classes),
+    e.g. QCPipeline(MissingValues("R_rs"), Jumps("Ed", 0.35), ClipToZero(),
+    Threshold("R_rs", "<", 0)). The steps run in order on the whole spectral
+    blocks of a SpectralTable; rejected rows are collected and removed once,
+    at the end. Rejection counts are available from `row_filter.report()`.
+    """
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.row_filter = None
+
+    def __repr__(self):
+        return f"QCPipeline ({len(self.steps)} steps)"
+
+    def run(self, data, quiet=False):
+        """
+        Apply the steps to `data`, an astropy Table or a SpectralTable, and
+        return the result in the same type. Tables are converted once.
+        """
+        is_table = not isinstance(data, SpectralTable)
+        spectral_table = SpectralTable.from_table(data) if is_table else data
+
+        self.row_filter = RowFilter(spectral_table)
+        for step in self.steps:
+            step(spectral_table, self.row_filter, quiet=quiet)
+        self.row_filter.apply(quiet=quiet)
+
+        return spectral_table.to_table() if is_table else spectral_table
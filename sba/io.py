@@ -3,63 +3,815 @@ Module with functions for file input/output
 """
 
 from astropy.io.ascii import read
+from astropy.table import Table
+from astropy.io import fits
 from numpy import loadtxt, genfromtxt
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from itertools import islice
+from hashlib import sha256
+from contextlib import contextmanager
+from functools import lru_cache
+import inspect
+import json
+import numpy as np
 import sys
-from .data_processing import split_spectrum
+import warnings
+from .data_processing import split_spectrum, get_keys_with_label, parse_schema, get_schema, SpectralSchema, SpectralTable
 
 
-def load_data_file(filename):
-    filename = Path(filename)
-    data = read(filename)
-    label = filename.stem[:-10]
+# Output formats for processed data, by file extension
+data_formats = {".tab": "ascii.fast_tab", ".fits": "fits", ".fits.gz": "fits"}
+
+# Name of the FITS extension with the original column names, see `pack_spectra`
+column_names_extension = "COLNAMES"
+maximum_fits_columns = 999
+
+
+def get_data_format(filename):
+    for extension, data_format in data_formats.items():
+        if Path(filename).name.endswith(extension):
+            return data_format
+    return None
+
+
+def is_binary(filename):
+    data_format = get_data_format(filename)
+    return data_format is not None and not data_format.startswith("ascii")
+
+
+def get_label(filename):
+    return Path(filename).name.split("_processed")[0]
+
+
+def find_data_files(folder="data"):
+    """
+    Find the processed data files in `folder`, in any of the `data_formats`.
+    If a data set has been written in several formats, only the most recently
+    modified file is returned, preferring the binary one if they are equally
+    recent. A warning is given if a binary file is older than a text file, as
+    it is probably out of date.
+    """
+    data_files = {}
+    for filename in sorted(Path(folder).glob("*_processed.*")):
+        if get_data_format(filename) is None:
+            continue
+        data_files.setdefault(get_label(filename), []).append(filename)
+
+    newest_files = []
+    for label, filenames in data_files.items():
+        filenames = sorted(filenames, key=lambda filename: (filename.stat().st_mtime_ns, is_binary(filename)))
+        newest = filenames[-1]
+        if any(is_binary(filename) for filename in filenames) and not is_binary(newest):
+            warnings.warn(f"{newest} is newer than the binary file(s) for {label}, which are ignored; re-write them with write_data", stacklevel=2)
+        newest_files.append(newest)
+    return newest_files
+
+
+def pack_spectra(data):
+    """
+    Stack the columns of each spectral quantity (see `SpectralSchema`) of a
+    table into a single 2-D column, e.g. all Ed_{wavelength} columns into
+    one Ed column. FITS tables can have at most 999 columns, which
+    hyperspectral data sets easily exceed. Returns the packed table and a
+    one-row table with the original column names, in order ("columns") and
+    per quantity, for `unpack_spectra`.
+    """
+    schema = get_schema(data)
+    spectral_keys = {key for quantity in schema.quantities for key in schema.keys(quantity)}
+    packed = Table([data[key] for key in data.colnames if key not in spectral_keys], meta=data.meta, copy=False)
+    names = Table([np.array([data.colnames])], names=["columns"])
+    for quantity in schema.quantities:
+        keys = schema.keys(quantity)
+        packed[quantity] = np.ma.stack([np.ma.asarray(data[key]) for key in keys], axis=1)
+        packed[quantity].unit = data[keys[0]].unit
+        names[quantity] = np.array([keys])
+    return packed, names
+
+
+def unpack_spectra(packed, names):
+    # Restore a table packed by `pack_spectra`, with its original columns and their order
+    data = Table(packed, copy=False)
+    for quantity in names.colnames[1:]:
+        keys = list(names[quantity][0])
+        column = data[quantity]
+        data.add_columns([column[:, i] for i in range(len(keys))], names=keys)
+        data.remove_column(quantity)
+    return data[list(names["columns"][0])]
+
+
+def write_fits(data, filename, **kwargs):
+    # Write a table to FITS with its spectra packed into 2-D columns, see `pack_spectra`
+    packed, names = pack_spectra(data)
+    if len(packed.columns) > maximum_fits_columns:
+        raise ValueError(f"Cannot write {len(packed.columns)} columns to {filename}; FITS tables have at most {maximum_fits_columns} columns, even with the spectra packed")
+    names_hdu = fits.table_to_hdu(names, character_as_bytes=True)
+    names_hdu.name = column_names_extension
+    hdus = fits.HDUList([fits.PrimaryHDU(), fits.table_to_hdu(packed, character_as_bytes=True), names_hdu])
+    hdus.writeto(filename, **kwargs)
+
 
+def read_fits(filename, include_names=None, **kwargs):
+    # Read a FITS table written by `write_fits`; files without packed spectra are read as they are
+    with fits.open(filename, memmap=False) as hdus:
+        data = Table.read(hdus, hdu=1, **kwargs)
+        if column_names_extension in hdus:
+            names = Table.read(hdus, hdu=column_names_extension, character_as_bytes=False)
+            data = unpack_spectra(data, names)
+    if include_names is not None:
+        data = data[[key for key in data.colnames if key in include_names]]
+    return data
+
+
+def read_data_table(filename, **kwargs):
+    """
+    Read a processed data file into a table, in whichever format it was
+    written by `write_data`. Keyword arguments are passed to the reader;
+    `include_names` selects columns in either format.
+    """
+    if is_binary(filename):
+        return read_fits(filename, **kwargs)
+    else:
+        return read(filename, **kwargs)
+
+
+def read_data_arrays(filename):
+    """
+    Parse a processed data file into the wavelengths, contiguous Ed, Lw and
+    R_rs arrays, and a structured array with the remaining (non-spectral)
+    columns.
+    """
+    data = read_data_table(filename)
+    return split_data_arrays(data)
+
+
+def split_data_arrays(data):
+    # Like `read_data_arrays`, for a table that has already been read
     wavelengths, Ed = split_spectrum(data, "Ed")
     wavelengths, Lw = split_spectrum(data, "Lw")
     wavelengths, R_rs = split_spectrum(data, "R_rs")
+    Ed, Lw, R_rs = [np.ascontiguousarray(spectra, dtype=np.float64) for spectra in (Ed, Lw, R_rs)]
+
+    spectral_keys = {key for keys in get_keys_with_label(data, "Ed", "Lw", "R_rs") for key in keys}
+    metadata_keys = [key for key in data.keys() if key not in spectral_keys]
+    if len(metadata_keys) > 0:
+        metadata = fill_masked_fields(data[metadata_keys].as_array())
+    else:
+        metadata = np.empty(len(data), dtype=[])
+
+    return wavelengths, Ed, Lw, R_rs, metadata
+
+
+def fill_masked_fields(array):
+    # Fill the masked values in a structured array field by field: NaN for floats, NumPy's default fill value otherwise
+    filled = np.empty(array.shape, dtype=array.dtype)
+    for name in array.dtype.names:
+        field = array[name]
+        filled[name] = np.ma.filled(field, np.nan if field.dtype.kind == "f" else None)
+    return filled
+
+
+@contextmanager
+def atomic_write(filename, mode="wb"):
+    """
+    Open a file for writing through a temporary file next to it, which only
+    replaces `filename` once it has been written completely, so other
+    processes never see a partial file.
+    """
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    temporary_file = filename.with_suffix(".tmp")
+    with open(temporary_file, mode) as file:
+        yield file
+    temporary_file.replace(filename)
+
+
+def get_code_hash(*functions):
+    # Hash of the source code of `functions`, so caches are rebuilt when that code changes
+    code_hash = sha256()
+    for function in functions:
+        try:
+            code_hash.update(inspect.getsource(function).encode())
+        except (OSError, TypeError):  # Source not available
+            code_hash.update(function.__code__.co_code)
+    return code_hash.hexdigest()
+
+
+data_cache_version = 1  # Increase when the cached arrays change in a way the code hash does not catch
+
+
+@lru_cache(maxsize=None)
+def get_data_code_hash():
+    # Hash of the code that turns a data file into the cached arrays
+    return get_code_hash(read_data_table, read_fits, unpack_spectra, split_data_arrays, fill_masked_fields, split_spectrum, SpectralSchema.__init__)
+
+
+def get_cache_file(filename):
+    return filename.parent/"cache"/f"{filename.name}.npz"
+
+
+def get_file_signature(filename):
+    # Identifies the data file and the code and version of the cache
+    stat = filename.stat()
+    return np.array([f"version:{data_cache_version}", f"code:{get_data_code_hash()}", f"{stat.st_mtime_ns}:{stat.st_size}"])
+
+
+def load_data_arrays(filename):
+    """
+    Like `read_data_arrays`, but using a binary cache next to the data file
+    (in a `cache` folder), which is rebuilt whenever the data file, the code
+    that reads it, or `data_cache_version` changes.
+    """
+    filename = Path(filename)
+    cache_file = get_cache_file(filename)
+    signature = get_file_signature(filename)
+    keys = ["wavelengths", "Ed", "Lw", "R_rs", "metadata"]
+
+    try:
+        with np.load(cache_file) as cache:
+            if not np.array_equal(cache["signature"], signature):
+                raise ValueError(f"Cache {cache_file} is out of date")
+            arrays = tuple(cache[key] for key in keys)
+    except (OSError, ValueError, KeyError):
+        arrays = read_data_arrays(filename)
+        with atomic_write(cache_file) as file:
+            np.savez(file, signature=signature, **dict(zip(keys, arrays)))
+
+    return arrays
+
+
+def load_data_file(filename):
+    filename = Path(filename)
+    label = get_label(filename)
+
+    wavelengths, Ed, Lw, R_rs, metadata = load_data_arrays(filename)
 
     return label, wavelengths, Ed, Lw, R_rs
 
 
+def timed_load_data_file(filename):
+    start = perf_counter()
+    result = load_data_file(filename)
+    return result, perf_counter() - start
+
+
+def load_data_files(filenames, workers=None, processes=False, quiet=False):
+    """
+    Load several processed data files concurrently, using `workers` threads
+    or, if `processes` is True, processes. Processes parse faster, but only
+    work from scripts that are guarded by `if __name__ == "__main__":`.
+    The results are returned in the same order as `filenames`, each in the
+    same format as from `load_data_file`.
+    """
+    filenames = list(filenames)
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    start = perf_counter()
+    with executor(max_workers=workers) as pool:
+        results_and_timings = list(pool.map(timed_load_data_file, filenames))
+
+    if not quiet:
+        for (label, wavelengths, Ed, *_), timing in results_and_timings:
+            print(f"Loaded {label} ({len(Ed)} spectra) in {timing:.2f} s")
+        print(f"Loaded {len(filenames)} data files in {perf_counter() - start:.2f} s")
+
+    results = [result for result, timing in results_and_timings]
+    return results
+
+
+def iterate_data_file(filename, chunk_size=1000):
+    """
+    Read a processed data file in chunks of `chunk_size` rows, without
+    loading the whole table into memory. Returns the label, the wavelengths
+    and a generator that yields (Ed, Lw, R_rs) for each chunk; these can be
+    passed directly to e.g. `Sensor.band_average_reflectance_radiance_chunks`.
+    Missing values are NaN, as in `load_data_file`.
+    """
+    filename = Path(filename)
+    label = get_label(filename)
+    if is_binary(filename):
+        wavelengths, chunks = iterate_fits_file(filename, chunk_size)
+        return label, wavelengths, chunks
+
+    with open(filename) as file:
+        header_line = 0
+        line = file.readline()
+        while line.startswith("#"):  # Skip comments, e.g. from the table metadata
+            header_line += 1
+            line = file.readline()
+    header = [key.strip('"') for key in line.rstrip("\n").split("\t")]
+    schema = parse_schema(tuple(header))
+    wavelengths = schema.wavelengths("R_rs").copy()
+    columns = np.concatenate([schema.indices(quantity) for quantity in ["Ed", "Lw", "R_rs"]])
+    ends = np.cumsum([len(schema.indices(quantity)) for quantity in ["Ed", "Lw", "R_rs"]])[:-1]
+
+    def chunks():
+        with open(filename) as file:
+            for i in range(header_line+1):  # Skip the comments and header
+                file.readline()
+            while True:
+                lines = list(islice(file, chunk_size))
+                if len(lines) == 0:
+                    break
+                try:
+                    data = np.loadtxt(lines, delimiter="\t", usecols=columns, ndmin=2)
+                except ValueError:  # Missing values
+                    data = np.genfromtxt(lines, delimiter="\t", usecols=columns, ndmin=2)
+                yield tuple(np.split(data, ends, axis=1))
+
+    return label, wavelengths, chunks()
+
+
+def iterate_fits_file(filename, chunk_size):
+    """
+    Like `iterate_data_file`, for a FITS file. Uncompressed files are
+    memory-mapped, so only one chunk of rows is read at a time; compressed
+    (.fits.gz) files are decompressed as a whole by astropy.
+    """
+    with fits.open(filename) as hdus:
+        packed = column_names_extension in hdus
+        if packed:
+            colnames = [decode(key) for key in hdus[column_names_extension].data["columns"][0]]
+        else:
+            colnames = hdus[1].columns.names
+    schema = parse_schema(tuple(colnames))
+    wavelengths = schema.wavelengths("R_rs").copy()
+
+    def chunks():
+        with fits.open(filename) as hdus:
+            data = hdus[1].data
+            for start in range(0, len(data), chunk_size):
+                rows = data[start:start+chunk_size]
+                if packed:
+                    yield tuple(np.array(rows[quantity], dtype=np.float64) for quantity in quantities)
+                else:
+                    yield tuple(np.array([rows[key] for key in schema.keys(quantity)], dtype=np.float64).T for quantity in quantities)
+
+    return wavelengths, chunks()
+
+
 def load_data():
     filename = Path(sys.argv[1])
     return load_data_file(filename)
 
 
-def write_data(data, label, **kwargs):
+def write_data(data, label, extension=".tab", **kwargs):
+    """
+    Write processed data to data/{label}_processed{extension}. The extension
+    selects the format (see `data_formats`): ".tab" gives a text table, while
+    ".fits" gives a binary table that keeps units and metadata and is much
+    faster to read back; ".fits.gz" is the same, compressed. In FITS, the
+    spectra are stored as one 2-D column per quantity (see `pack_spectra`).
+    `data` can be an astropy Table or a SpectralTable.
+    """
+    if isinstance(data, SpectralTable):
+        data = data.to_table()
     label_lowercase = label.lower()
-    data.write(f"data/{label_lowercase}_processed.tab", format="ascii.fast_tab", overwrite=True, **kwargs)
+    data_format = data_formats[extension]
+    filename = Path(f"data/{label_lowercase}_processed{extension}")
+    if data_format == "fits":
+        write_fits(data, filename, overwrite=True, **kwargs)
+    else:
+        data.write(filename, format=data_format, overwrite=True, **kwargs)
+    update_manifest(describe_data(data, filename))
 
 
-def find_phrase(lines, phrase):
-    first_line = [line for line in lines if phrase in line][0]
-    return first_line
+def read_pangaea_header(file):
+    """
+    Read the metadata block (between /* and */) at the start of a PANGAEA
+    .tab file, given as an open file, and return its fields as a dictionary,
+    e.g. {"Citation": "...", ...}. Multi-line values are joined with
+    newlines; blank lines are skipped. The file is left positioned at the
+    column header line.
+    """
+    header = {}
+    key = None
+    for line in file:
+        if line.startswith("*/"):
+            break
+        line = line.rstrip("\n")
+        if line.startswith("/*"):
+            line = line[2:]
+        if not line.strip():
+            continue
+        if line.startswith("\t") and key is not None:  # Continuation of the previous field
+            header[key] += "\n" + line.strip()
+        else:
+            key, _, value = line.partition(":")
+            key = key.strip()
+            header[key] = value.strip()
+    return header
 
 
-def find_coordinates_seabass(lines):
-    lat_line = find_phrase(lines, "north_latitude")
-    latitude = float(lat_line[16:-6])
+def read_pangaea(filename, **kwargs):
+    """
+    Read a PANGAEA .tab file: the metadata block is parsed up to */, and the
+    data section after it is read by the fast (C) tab-delimited reader
+    straight from the file, without format guessing. Keyword arguments (e.g.
+    `include_names`) are passed to astropy.io.ascii.read. To replace the
+    column names, pass format="no_header" and `names`; the column header line
+    is then skipped.
+    Returns the metadata (see `read_pangaea_header`) and the data table.
+    """
+    header_lines = read_header_lines(filename, "*/")
+    header = read_pangaea_header(header_lines)
 
-    lon_line = find_phrase(lines, "west_longitude")
-    longitude = float(lon_line[16:-6])
+    header_start = count_table_lines(header_lines)
+    kwargs.setdefault("format", "fast_tab")
+    if "no_header" not in kwargs["format"]:
+        kwargs.setdefault("header_start", header_start)
+    kwargs.setdefault("delimiter", "\t")
+    data = read(filename, guess=False, data_start=header_start+1, **kwargs)
+    return header, data
+
+
+def read_header_lines(filename, end):
+    # Lines at the start of a file, up to and including the first line that starts with `end`
+    header_lines = []
+    with open(filename, "r") as file:
+        for line in file:
+            header_lines.append(line)
+            if line.startswith(end):
+                break
+    return header_lines
+
+
+def count_table_lines(lines):
+    # Number of lines as counted by astropy.io.ascii.read, which skips blank and comment lines
+    return sum(1 for line in lines if line.strip() and not line.lstrip().startswith("#"))
 
-    return longitude, latitude
 
+seabass_delimiters = {"comma": ",", "tab": None, "space": None}
+seabass_table_delimiters = {"comma": ",", "tab": "\t", "space": " "}
 
-def fine_datetime_seabass(lines):
-    date_line = find_phrase(lines, "end_date")
-    date = int(date_line[10:])
 
-    time_line = find_phrase(lines, "start_time")
-    time = time_line[12:-6]
+def read_seabass_header(file):
+    """
+    Read the header of a SeaBASS file (given as a filename or an open file)
+    up to and including the /end_header line, and return its fields as a
+    dictionary, e.g. {"north_latitude": "10.5[DEG]", ...}. An open file is
+    left positioned at the start of the data.
+    """
+    if isinstance(file, (str, Path)):
+        with open(file, "r") as f:
+            return read_seabass_header(f)
+
+    header = {}
+    for line in file:
+        if line.startswith("/end_header"):
+            break
+        if line.startswith("/") and "=" in line:
+            key, value = line[1:].strip().split("=", 1)
+            header[key.lower()] = value
+    return header
+
+
+def read_seabass(filename, **kwargs):
+    """
+    Read a SeaBASS file in a single pass: the header is parsed up to
+    /end_header and the data block directly after it is read with
+    np.loadtxt, using the delimiter given in the header. Keyword arguments
+    (e.g. `usecols`, `unpack`, `dtype`) are passed to np.loadtxt.
+    Returns the header (see `read_seabass_header`) and the data.
+    """
+    with open(filename, "r") as file:
+        header = read_seabass_header(file)
+        kwargs.setdefault("delimiter", seabass_delimiters.get(header.get("delimiter", "").lower()))
+        data = loadtxt(file, **kwargs)
+
+    return header, data
+
+
+def read_seabass_table(filename, **kwargs):
+    """
+    Read a SeaBASS file into a table, with the columns named after the
+    /fields entry of the header. The header is parsed up to /end_header to
+    find where the data block starts, which is then read with
+    astropy.io.ascii.read, so every column gets its own type (e.g. strings
+    for dates and times). Columns beyond the /fields entry keep their
+    default names (col1, col2, ...). Keyword arguments are passed to
+    astropy.io.ascii.read.
+    Returns the header (see `read_seabass_header`) and the data table.
+    """
+    header_lines = read_header_lines(filename, "/end_header")
+    header = read_seabass_header(header_lines)
+
+    delimiter = seabass_table_delimiters.get(header.get("delimiter", "").lower())
+    if delimiter is not None:
+        kwargs.setdefault("delimiter", delimiter)
+    data = read(filename, format="no_header", data_start=count_table_lines(header_lines), **kwargs)
+
+    fields = header["fields"].split(",") if "," in header["fields"] else header["fields"].split()
+    for column, field in zip(data.colnames, fields):
+        data.rename_column(column, field.strip())
+
+    return header, data
+
+
+def strip_unit(value):
+    # Remove the unit from a SeaBASS header value, e.g. "10.5[DEG]" -> "10.5"
+    return value.split("[")[0].strip()
+
+
+def find_coordinates_seabass(header):
+    latitude = float(strip_unit(header["north_latitude"]))
+    longitude = float(strip_unit(header["west_longitude"]))
+
+    return longitude, latitude
+
+
+def fine_datetime_seabass(header):
+    date = int(strip_unit(header["end_date"]))
+    time = strip_unit(header["start_time"])
 
     return date, time
 
 
-def find_auxiliary_information_seabass(file):
-    with open(file, "r") as f:
-        lines = f.readlines()
-        lon, lat = find_coordinates_seabass(lines)
-        date, time = fine_datetime_seabass(lines)
+def auxiliary_information_seabass(header):
+    lon, lat = find_coordinates_seabass(header)
+    date, time = fine_datetime_seabass(header)
 
     return date, time, lon, lat
+
+
+def find_auxiliary_information_seabass(file):
+    header = read_seabass_header(file)
+    return auxiliary_information_seabass(header)
+
+
+def decode(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def parse_time_of_day(value):
+    # Convert "hh:mm:ss" into a time delta; seconds may be "60", as in some SeaBASS files
+    hours, minutes, seconds = [float(part) for part in decode(value).split(":")]
+    return np.timedelta64(int(round(3600*hours + 60*minutes + seconds)), "s")
+
+
+def get_times(metadata):
+    """
+    Get the observation times (datetime64, NaT where unknown) from the
+    non-spectral columns of a processed data set. These contain either
+    "Date/Time" (ISO format), "Date" (YYYYMMDD) and "Time" (hh:mm:ss), or
+    "year", "jd" (day of year) and "time" (hh:mm:ss).
+    """
+    names = metadata.dtype.names or ()
+    times = np.full(len(metadata), np.datetime64("NaT"), dtype="datetime64[s]")
+    date_time_keys = [name for name in names if name == "Date/Time"] + [name for name in names if name.startswith("Date/Time") and "UTC" in name]
+
+    for i, row in enumerate(metadata):
+        try:
+            if date_time_keys:
+                times[i] = np.datetime64(decode(row[date_time_keys[0]]))
+            elif "Date" in names and "Time" in names:
+                date = decode(row["Date"])
+                times[i] = np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:8]}") + parse_time_of_day(row["Time"])
+            elif "year" in names and "jd" in names and "time" in names:
+                times[i] = np.datetime64(f"{int(row['year']):04d}-01-01") + np.timedelta64(int(row["jd"])-1, "D") + parse_time_of_day(row["time"])
+        except ValueError:
+            continue
+
+    return times
+
+
+def get_coordinates(metadata):
+    # Latitude and longitude of each row, NaN where unknown
+    names = metadata.dtype.names or ()
+    latitude, longitude = [np.array(metadata[key], dtype=np.float64) if key in names else np.full(len(metadata), np.nan) for key in ["Latitude", "Longitude"]]
+    return latitude, longitude
+
+
+quantities = ["Ed", "Lw", "R_rs"]
+corpus_dataset_dtype = [("label", "U64"), ("first_row", np.int64), ("N", np.int64), ("first_wavelength", np.int64), ("number_of_wavelengths", np.int64), ("offset", np.int64)]
+corpus_row_dtype = [("dataset", np.int32), ("latitude", np.float64), ("longitude", np.float64), ("time", "datetime64[s]")]
+
+
+def write_corpus(data_files, folder="data/corpus"):
+    """
+    Combine processed data files into one on-disk corpus in `folder`, which
+    can be read with `Corpus` without loading it into memory. Each quantity
+    is stored as one flat array of every data set's (N x wavelengths) block,
+    with per-data set offsets, wavelengths, and per-row coordinates and times.
+    Only one data set is kept in memory at a time.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    data_files = [Path(file) for file in data_files]
+
+    # First pass: determine the size of each data set
+    datasets = np.zeros(len(data_files), dtype=corpus_dataset_dtype)
+    first_row = first_wavelength = offset = 0
+    for dataset, file in zip(datasets, data_files):
+        wavelengths, Ed, *_ = load_data_arrays(file)
+        dataset["label"] = get_label(file)
+        dataset["first_row"], dataset["N"] = first_row, len(Ed)
+        dataset["first_wavelength"], dataset["number_of_wavelengths"] = first_wavelength, len(wavelengths)
+        dataset["offset"] = offset
+        first_row += len(Ed)
+        first_wavelength += len(wavelengths)
+        offset += Ed.size
+
+    # Second pass: fill in the data
+    spectra = {quantity: np.lib.format.open_memmap(folder/f"{quantity}.npy", mode="w+", dtype=np.float64, shape=(offset,)) for quantity in quantities}
+    rows = np.lib.format.open_memmap(folder/"rows.npy", mode="w+", dtype=corpus_row_dtype, shape=(first_row,))
+    wavelengths_all = np.zeros(first_wavelength)
+    for i, (dataset, file) in enumerate(zip(datasets, data_files)):
+        wavelengths, Ed, Lw, R_rs, metadata = load_data_arrays(file)
+        wavelengths_all[dataset["first_wavelength"]:dataset["first_wavelength"]+len(wavelengths)] = wavelengths
+        for quantity, data in zip(quantities, [Ed, Lw, R_rs]):
+            spectra[quantity][dataset["offset"]:dataset["offset"]+data.size] = data.ravel()
+
+        rows_dataset = rows[dataset["first_row"]:dataset["first_row"]+dataset["N"]]
+        rows_dataset["dataset"] = i
+        rows_dataset["latitude"], rows_dataset["longitude"] = get_coordinates(metadata)
+        rows_dataset["time"] = get_times(metadata)
+
+    for array in [*spectra.values(), rows]:
+        array.flush()
+    np.save(folder/"wavelengths.npy", wavelengths_all)
+    np.save(folder/"datasets.npy", datasets)
+
+
+class Corpus(object):
+    """
+    Memory-mapped corpus of processed data sets, as written by `write_corpus`.
+    Data are only read from disk when they are accessed.
+    """
+    def __init__(self, folder="data/corpus"):
+        folder = Path(folder)
+        self.datasets = np.load(folder/"datasets.npy")
+        self.rows = np.load(folder/"rows.npy", mmap_mode="r")
+        self.wavelengths = np.load(folder/"wavelengths.npy", mmap_mode="r")
+        self.spectra = {quantity: np.load(folder/f"{quantity}.npy", mmap_mode="r") for quantity in quantities}
+
+    def __repr__(self):
+        return f"Corpus ({len(self.datasets)} data sets, {len(self.rows)} spectra)"
+
+    def __len__(self):
+        return len(self.datasets)
+
+    @property
+    def labels(self):
+        return self.datasets["label"].tolist()
+
+    def get_dataset(self, label):
+        index = self.labels.index(label) if isinstance(label, str) else label
+        return self.datasets[index]
+
+    def get_wavelengths(self, label):
+        dataset = self.get_dataset(label)
+        return self.wavelengths[dataset["first_wavelength"]:dataset["first_wavelength"]+dataset["number_of_wavelengths"]]
+
+    def get_rows(self, label, rows=slice(None)):
+        dataset = self.get_dataset(label)
+        return self.rows[dataset["first_row"]:dataset["first_row"]+dataset["N"]][rows]
+
+    def split_rows(self, indices):
+        """
+        Convert indices into `self.rows` (e.g. from `sba.spatial.SpectraIndex`)
+        into the rows within each data set, as a dictionary {label: rows}.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        datasets = self.rows["dataset"][indices]
+        return {self.labels[i]: indices[datasets == i] - self.datasets[i]["first_row"] for i in np.unique(datasets)}
+
+    def get_spectra(self, label, quantity, rows=slice(None), wavelength_range=None):
+        """
+        Get the spectra of one quantity (Ed, Lw or R_rs) in one data set, as a
+        read-only (N x wavelengths) view, optionally only for the given `rows`
+        and/or the wavelengths within `wavelength_range` (minimum, maximum).
+        """
+        dataset = self.get_dataset(label)
+        block = self.spectra[quantity][dataset["offset"]:dataset["offset"]+dataset["N"]*dataset["number_of_wavelengths"]]
+        block = block.reshape(dataset["N"], dataset["number_of_wavelengths"])
+        return block[rows, self.wavelength_slice(label, wavelength_range)]
+
+    def wavelength_slice(self, label, wavelength_range=None):
+        # Slice selecting the wavelengths within `wavelength_range` (minimum, maximum)
+        if wavelength_range is None:
+            return slice(None)
+        wavelengths = self.get_wavelengths(label)
+        first = np.searchsorted(wavelengths, wavelength_range[0], side="left")
+        last = np.searchsorted(wavelengths, wavelength_range[1], side="right")
+        return slice(first, last)
+
+    def load(self, label, rows=slice(None), wavelength_range=None):
+        # Same output as `load_data_file`
+        dataset = self.get_dataset(label)
+        wavelengths = self.get_wavelengths(label)[self.wavelength_slice(label, wavelength_range)]
+        Ed, Lw, R_rs = [self.get_spectra(label, quantity, rows=rows, wavelength_range=wavelength_range) for quantity in quantities]
+        return str(dataset["label"]), wavelengths, Ed, Lw, R_rs
+
+
+manifest_file = Path("data/manifest.json")
+
+
+def get_file_hash(filename, chunk_size=2**20):
+    file_hash = sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_qc_steps(meta):
+    """
+    QC steps recorded in table metadata. A FITS round trip renames "qc" to
+    "QC" and turns a single step into a plain string, and later steps may be
+    added under "qc" again, so both keys are combined.
+    """
+    steps = []
+    for key in ["QC", "qc"]:
+        value = meta.get(key, [])
+        steps.extend([value] if isinstance(value, str) else value)
+    return [str(step) for step in steps]
+
+
+def describe_data(data, filename):
+    """
+    Summarise a processed data set (table) for the manifest: its label, file,
+    number of spectra, wavelengths, bounding box (minimum and maximum
+    latitude and longitude), time range, file hash, and the QC filters
+    applied to it (as recorded in data.meta["qc"]).
+    """
+    filename = Path(filename)
+    wavelengths, Ed, Lw, R_rs, metadata = split_data_arrays(data)
+    latitude, longitude = get_coordinates(metadata)
+    times = get_times(metadata)
+    times = times[~np.isnat(times)]
+
+    if np.isfinite(latitude).any() and np.isfinite(longitude).any():
+        bbox = [np.nanmin(latitude), np.nanmax(latitude), np.nanmin(longitude), np.nanmax(longitude)]
+        bbox = [float(value) for value in bbox]
+    else:
+        bbox = None
+    time_range = [str(times.min()), str(times.max())] if len(times) > 0 else None
+
+    description = {"label": get_label(filename), "file": filename.name, "N": len(data), "wavelengths": wavelengths.tolist(), "bbox": bbox, "time_range": time_range, "sha256": get_file_hash(filename), "qc": get_qc_steps(data.meta)}
+    return description
+
+
+def load_manifest(filename=manifest_file):
+    # Manifest entries by label; empty if there is no manifest yet
+    try:
+        with open(filename) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest, filename=manifest_file):
+    with atomic_write(filename, "w") as file:
+        json.dump(manifest, file, indent=1)
+
+
+def update_manifest(description, filename=manifest_file):
+    manifest = load_manifest(filename)
+    manifest[description["label"]] = description
+    save_manifest(manifest, filename)
+
+
+def build_manifest(data_files, filename=manifest_file, quiet=False):
+    """
+    (Re-)build the manifest entries for existing processed data files, e.g.
+    ones written before the manifest existed. QC filters are only known if
+    they were saved in the file metadata.
+    """
+    manifest = load_manifest(filename)
+    for data_file in data_files:
+        description = describe_data(read_data_table(data_file), data_file)
+        manifest[description["label"]] = description
+        if not quiet:
+            print(f"Added {description['label']} ({description['N']} spectra) to the manifest")
+    save_manifest(manifest, filename)
+
+
+def select_datasets(wavelength_range=None, bbox=None, time_range=None, filename=manifest_file):
+    """
+    Select data sets from the manifest without opening the data files.
+    Data sets are selected if they cover all of `wavelength_range`
+    (minimum, maximum), overlap `bbox` (minimum and maximum latitude and
+    longitude), and overlap `time_range` (start, end; ISO strings or
+    datetime64). Returns the manifest entries of the selected data sets.
+    """
+    selected = []
+    for description in load_manifest(filename).values():
+        if wavelength_range is not None:
+            wavelengths = description["wavelengths"]
+            if len(wavelengths) == 0 or min(wavelengths) > wavelength_range[0] or max(wavelengths) < wavelength_range[1]:
+                continue
+        if bbox is not None:
+            if description["bbox"] is None:
+                continue
+            lat_min, lat_max, lon_min, lon_max = description["bbox"]
+            if lat_max < bbox[0] or lat_min > bbox[1] or lon_max < bbox[2] or lon_min > bbox[3]:
+                continue
+        if time_range is not None:
+            if description["time_range"] is None:
+                continue
+            start, end = [np.datetime64(time) for time in description["time_range"]]
+            if end < np.datetime64(time_range[0]) or start > np.datetime64(time_range[1]):
+                continue
+        selected.append(description)
+    return selected
@@ -6,7 +6,12 @@ import xarray as xr
 import numpy as np
 from matplotlib import pyplot as plt
 from . import bandaveraging as ba, plotting as p
+from .io import atomic_write, get_code_hash
 from pathlib import Path
+from functools import wraps
+from copy import copy
+import inspect
+import threading
 import sys
 
 
@@ -16,14 +21,58 @@ class Band(object):
         self.colour = colour
 
         assert len(wavelengths) == len(response)
-        self.wavelengths = wavelengths
-        self.response = response
+        # Wavelength grid, which may be shared with other bands; the band only
+        # covers `self.wavelengths`, which starts at index `self.offset`
+        self.grid = np.asarray(wavelengths)
+        self.offset = 0
+        self.wavelengths = self.grid
+        self.response = np.asarray(response)
+
+        # Convolution weights per data wavelength grid, see `convolution_weights`
+        self._convolution_weights = {}
+
+        # Only store the non-zero part of the response
+        self.restrict(*ba.nonzero_support(self.response))
 
     def __repr__(self):
         return self.label
 
-    def convolve(self, *args, **kwargs):
-        result = ba.bandaverage_multi(self.wavelengths, self.response, *args, **kwargs)
+    def convolution_weights(self, data_wavelengths):
+        key = ba.wavelength_key(data_wavelengths)
+        if key not in self._convolution_weights:
+            self._convolution_weights[key] = ba.convolution_weights(self.wavelengths, self.response, data_wavelengths)
+        return self._convolution_weights[key]
+
+    def restrict(self, first, end):
+        # Restrict the band to elements first:end of its current wavelengths.
+        # The band is kept starting at an even index in the grid, with an odd
+        # number of elements where possible, so Simpson integration pairs up
+        # the same intervals as it would on the full grid.
+        first, end, end_current = self.offset + first, self.offset + end, self.offset + len(self.response)
+        first -= first % 2
+        if (end - first) % 2 == 0 and end < end_current:
+            end += 1
+
+        self.response = self.response[first-self.offset:end-self.offset].copy()
+        self.offset = first
+        self.wavelengths = self.grid[first:end]
+        self._convolution_weights.clear()
+
+    def truncate(self, tolerance=1e-4):
+        # Copy of this band without the tails of its response, see `ba.truncated_support`
+        band = copy(self)
+        band._convolution_weights = {}
+        band.restrict(*ba.truncated_support(self.wavelengths, self.response, tolerance=tolerance))
+        return band
+
+    def convolve(self, data_wavelengths, data_response_multi):
+        weights = self.convolution_weights(data_wavelengths)
+        result = ba.apply_in_chunks(lambda data: ba.apply_convolution_weights(weights, data), data_response_multi, len(data_wavelengths))
+        return result
+
+    def convolve_reflectance_radiance(self, data_wavelengths, Ed, Lw, R_rs):
+        weights = self.convolution_weights(data_wavelengths)
+        result = ba.convolve_reflectance_radiance(lambda data: ba.apply_convolution_weights(weights, data), Ed, Lw, R_rs)
         return result
 
 
@@ -34,6 +83,9 @@ class Sensor(object):
         assert len(band_labels) == len(colours) == len(response_wavelengths) == len(responses)
         self.bands = [Band(label, wavelengths, response, colour) for label, wavelengths, response, colour in zip(band_labels, response_wavelengths, responses, colours)]
 
+        # Convolution operators for all bands per data wavelength grid, see `convolution_operator`
+        self._convolution_operators = {}
+
     def __repr__(self):
         return f"{self.name} ({len(self.bands)} bands)"
 
@@ -43,6 +95,18 @@ class Sensor(object):
     def get_band_colours(self):
         return [band.colour for band in self.bands]
 
+    def truncate(self, tolerance=1e-4):
+        """
+        Copy of this sensor with the tails of every band response removed,
+        see `ba.truncated_support`. This is opt-in, because it changes band
+        averages by up to a relative `tolerance`. A copy is returned so the
+        shared sensors from `memoize_sensor` are left unchanged.
+        """
+        sensor = copy(self)
+        sensor.bands = [band.truncate(tolerance=tolerance) for band in self.bands]
+        sensor._convolution_operators = {}
+        return sensor
+
     def plot(self, ax=None, saveto=None):
         if ax is None:
             fig, ax = plt.subplots(figsize=(6,2), tight_layout=True)
@@ -71,8 +135,26 @@ class Sensor(object):
             plt.show()
             plt.close()
 
-    def band_average(self, *args, **kwargs):
-        result = np.array([band.convolve(*args, **kwargs) for band in self.bands])
+    def convolution_operator(self, data_wavelengths):
+        key = ba.wavelength_key(data_wavelengths)
+        if key not in self._convolution_operators:
+            weights = [band.convolution_weights(data_wavelengths) for band in self.bands]
+            self._convolution_operators[key] = ba.convolution_operator(weights, len(data_wavelengths))
+        return self._convolution_operators[key]
+
+    def band_average(self, data_wavelengths, data_response_multi):
+        operator = self.convolution_operator(data_wavelengths)
+        result = ba.apply_in_chunks(lambda data: ba.apply_convolution_operator(operator, data), data_response_multi, len(data_wavelengths))
+        return result
+
+    def band_average_reflectance_radiance(self, data_wavelengths, Ed, Lw, R_rs):
+        operator = self.convolution_operator(data_wavelengths)
+        result = ba.convolve_reflectance_radiance(lambda data: ba.apply_convolution_operator(operator, data), Ed, Lw, R_rs)
+        return result
+
+    def band_average_reflectance_radiance_chunks(self, data_wavelengths, chunks):
+        operator = self.convolution_operator(data_wavelengths)
+        result = ba.convolve_reflectance_radiance_chunks(lambda data: ba.apply_convolution_operator(operator, data), chunks, len(data_wavelengths))
         return result
 
     def boxplot_relative(self, *args, **kwargs):
@@ -84,19 +166,65 @@ class Sensor(object):
 
 def generate_boxcar(center, fwhm, boxcar_wavelength_step=0.1):
     half_width = fwhm / 2.
-    wavelengths_in_boxcar = np.arange(center-half_width, center+half_width+boxcar_wavelength_step, boxcar_wavelength_step)
+    # Exactly from center-half_width to center+half_width, as in `synthetic_sensor_sweep`
+    number_of_steps = max(int(np.ceil(fwhm / boxcar_wavelength_step - 1e-9)), 1)
+    wavelengths_in_boxcar = np.linspace(center-half_width, center+half_width, number_of_steps+1)
     response = np.ones_like(wavelengths_in_boxcar)
     boxcar_sensor = Sensor("Boxcar", [f"{center:.1f} +- {half_width:.1f} nm"], [""], [wavelengths_in_boxcar], [response])
     return boxcar_sensor
 
 
-def generate_gaussian(center, fwhm, wavelengths=np.arange(320, 800, 0.1)):
+def generate_gaussian(center, fwhm, wavelengths=np.arange(320, 800, 0.1), truncate=5):
     sigma = fwhm/2.355
+    # Only sample the Gaussian within `truncate` sigma of the center; the
+    # fraction of the response outside this range is erfc(truncate/sqrt(2)),
+    # e.g. 6e-7 for truncate=5
+    if truncate is not None:
+        wavelengths = wavelengths[np.abs(wavelengths - center) <= truncate * sigma]
     response = np.exp(-(wavelengths-center)**2 / (2 * sigma**2))
     gaussian_sensor = Sensor("Gaussian", [f"{center:.1f} +- {sigma:.1f} nm"], [""], [wavelengths], [response])
     return gaussian_sensor
 
 
+def synthetic_sensor_sweep(sensor_type, wavelengths_central, FWHMs, data_wavelengths, Ed, Lw, R_rs, percentiles=[5, 50, 95]):
+    """
+    Convolve data with a whole family of synthetic (boxcar or Gaussian)
+    bands, one for every combination of central wavelength and FWHM, and
+    calculate percentiles of the absolute and relative differences between
+    reflectance-space and radiance-space convolution.
+
+    For every central wavelength, all FWHMs and all spectra are done at once:
+    boxcars through their cumulative integrals, Gaussians through their
+    closed-form convolution weights.
+
+    Returns an array with shape (len(percentiles), 2, len(FWHMs), len(wavelengths_central)),
+    the second axis being absolute/relative differences.
+    """
+    assert sensor_type in ["boxcar", "gaussian"], f"Unknown sensor type {sensor_type}"
+
+    data_wavelengths = np.asarray(data_wavelengths, dtype=np.float64)
+    FWHMs = np.asarray(FWHMs, dtype=np.float64)
+    data_combined = np.concatenate([R_rs, Lw, Ed])
+    if sensor_type == "boxcar":
+        cumulative = ba.cumulative_integral(data_wavelengths, data_combined)
+
+    results = np.tile(np.nan, [len(percentiles), 2, len(FWHMs), len(wavelengths_central)])
+    for i, center in enumerate(wavelengths_central):
+        if sensor_type == "boxcar":
+            data_averaged = ba.bandaverage_boxcar(center-FWHMs/2, center+FWHMs/2, data_wavelengths, data_combined, cumulative=cumulative)
+        else:
+            weights = ba.gaussian_weights(center, FWHMs, data_wavelengths)
+            data_averaged = ba.apply_weights(weights, data_combined)
+
+        reflectance_space, Lw_averaged, Ed_averaged = np.split(data_averaged, 3, axis=-1)
+        radiance_space = Lw_averaged / Ed_averaged
+        difference_combined = np.stack(ba.calculate_differences(reflectance_space, radiance_space))
+
+        results[..., i] = np.percentile(difference_combined, percentiles, axis=-1)
+
+    return results
+
+
 def read_synthetic_sensor_type():
     sensor_type = sys.argv[2]
     if sensor_type == "gauss":
@@ -114,6 +242,105 @@ def load_synthetic_sensor(sensor_type, center, fwhm, **kwargs):
     return sensor
 
 
+cache_folder = Path("spectral_response/cache/")
+cache_version = 1  # Increase when the cached format or the processing of loaded SRFs changes
+
+
+def save_sensor_cache(sensor, cache_file, signature):
+    # Bands that share a wavelength grid also share it in the cache
+    grids, grid_indices = [], []
+    for band in sensor.bands:
+        matches = [i for i, grid in enumerate(grids) if grid is band.grid]
+        if not matches:
+            grids.append(band.grid)
+            matches = [len(grids)-1]
+        grid_indices.append(matches[0])
+
+    arrays = {f"grid_{i}": grid for i, grid in enumerate(grids)}
+    arrays.update(signature=signature, name=sensor.name, band_labels=sensor.get_band_labels(), colours=sensor.get_band_colours(),
+                  grid_indices=grid_indices, offsets=[band.offset for band in sensor.bands], lengths=[len(band.response) for band in sensor.bands],
+                  responses=np.concatenate([band.response for band in sensor.bands]))
+
+    with atomic_write(cache_file) as file:
+        np.savez(file, **arrays)
+
+
+def load_sensor_cache(cache_file, signature):
+    with np.load(cache_file) as cache:
+        if not np.array_equal(cache["signature"], signature):
+            raise ValueError(f"Cache {cache_file} is out of date")
+
+        grids = [cache[f"grid_{i}"] for i in range(cache["grid_indices"].max()+1)]
+        ends = np.cumsum(cache["lengths"])
+        responses = np.split(cache["responses"], ends[:-1])
+        response_wavelengths = [grids[i][offset:offset+length] for i, offset, length in zip(cache["grid_indices"], cache["offsets"], cache["lengths"])]
+        sensor = Sensor(str(cache["name"]), cache["band_labels"].tolist(), cache["colours"].tolist(), response_wavelengths, responses)
+
+    return sensor
+
+
+def cache_sensor(*patterns):
+    """
+    Decorator that caches the Sensor returned by a load function in a binary
+    file in `cache_folder`, so the SRF files only need to be parsed once.
+    The cache is rebuilt whenever any of the source files (matching the glob
+    `patterns`) is added, removed or modified, when the code of the load
+    function or of the band processing (normalisation, trimming) changes,
+    and when `cache_version` is increased.
+    """
+    def decorator(function):
+        # Include the module functions the loader calls, e.g. load_Sentinel2 for load_Sentinel2A
+        helpers = [function.__globals__[name] for name in function.__code__.co_names if inspect.isfunction(function.__globals__.get(name)) and function.__globals__[name].__module__ == function.__module__]
+        code_hash = get_code_hash(function, *helpers, Sensor.__init__, Band.__init__, Band.restrict, ba.nonzero_support)
+
+        @wraps(function)
+        def load():
+            sources = sorted(file for pattern in patterns for file in Path().glob(pattern))
+            signature = np.array([f"version:{cache_version}", f"code:{code_hash}"] + [f"{file}:{file.stat().st_mtime_ns}:{file.stat().st_size}" for file in sources])
+            cache_file = cache_folder/f"{function.__name__}.npz"
+            try:
+                sensor = load_sensor_cache(cache_file, signature)
+            except (OSError, ValueError, KeyError):
+                sensor = function()
+                save_sensor_cache(sensor, cache_file, signature)
+            return sensor
+        return load
+    return decorator
+
+
+# Sensors that have been loaded in this process, by load function name
+sensor_registry = {}
+sensor_registry_lock = threading.RLock()
+
+
+def memoize_sensor(function):
+    """
+    Decorator that makes a load function build its Sensor only once per
+    process. Every caller, including `from_name`, `load_selected_sensors`,
+    `load_all_sensors` and `sba.chla`, gets the same Sensor object, so
+    convolution operators are also shared. Use `clear_sensor_registry` to
+    force a reload.
+    """
+    @wraps(function)
+    def load():
+        with sensor_registry_lock:
+            if function.__name__ not in sensor_registry:
+                sensor_registry[function.__name__] = function()
+            return sensor_registry[function.__name__]
+    return load
+
+
+def clear_sensor_registry(*functions):
+    # Forget the given load functions' sensors, or all sensors if none are given
+    with sensor_registry_lock:
+        if len(functions) == 0:
+            sensor_registry.clear()
+        for function in functions:
+            sensor_registry.pop(function.__name__, None)
+
+
+@memoize_sensor
+@cache_sensor("spectral_response/OLI/*.txt")
 def load_OLI():
     band_data_labels = ["CA", "Blue", "Green", "Red", "NIR"]
     band_labels = ["Band 1\nCoastal aerosol", "Band 2\nBlue", "Band 3\nGreen", "Band 4\nRed", "Band 5\nNIR"]
@@ -127,6 +354,8 @@ def load_OLI():
     return OLI
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/ETM+/spectral_b*.dat")
 def load_ETM_plus():
     bands = [1,2,3,4]
     band_labels = ["Blue", "Green", "Red", "NIR"]
@@ -140,6 +369,8 @@ def load_ETM_plus():
     return ETM_plus
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/VIIRSN_IDPSv3_RSRs.txt")
 def load_VIIRS():
     band_labels = [f"M{j}" for j in np.arange(1,9)]
     wavelengths_viirs, *responses_raw = np.loadtxt("spectral_response/VIIRSN_IDPSv3_RSRs.txt", skiprows=5, unpack=True, usecols=np.arange(9))
@@ -153,6 +384,8 @@ def load_VIIRS():
     return VIIRS
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/SeaWiFS_RSRs.txt")
 def load_SeaWiFS():
     band_labels = [f"{wvl} nm" for wvl in [412, 443, 490, 510, 555, 670, 765, 865]]
     wavelengths_seawifs, *responses_raw = np.loadtxt("spectral_response/SeaWiFS_RSRs.txt", skiprows=9, unpack=True)
@@ -178,10 +411,14 @@ def load_Sentinel2(AB="A"):
     return Sentinel2
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/MSI/MSI_S2A.txt")
 def load_Sentinel2A():
     return load_Sentinel2("A")
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/MSI/MSI_S2B.txt")
 def load_Sentinel2B():
     return load_Sentinel2("B")
 
@@ -199,14 +436,20 @@ def load_MODIS(AT="A"):
     return MODIS
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/HMODISA_RSRs.txt")
 def load_MODISA():
     return load_MODIS("A")
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/HMODIST_RSRs.txt")
 def load_MODIST():
     return load_MODIS("T")
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/MERIS_RSRs.txt")
 def load_MERIS():
     band_labels = [f"b{j}" for j in range(1,16)]
     wavelengths_meris, *responses = np.loadtxt("spectral_response/MERIS_RSRs.txt", skiprows=5, unpack=True)
@@ -220,6 +463,8 @@ def load_MERIS():
     return MERIS
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/CZCS_RSRs.txt")
 def load_CZCS():
     band_labels = [f"{wvl} nm" for wvl in [443, 520, 550, 670]]
     wavelengths_czcs, *responses = np.loadtxt("spectral_response/CZCS_RSRs.txt", skiprows=56, unpack=True)
@@ -246,14 +491,20 @@ def load_OLCI(AB="A"):
     return OLCI
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/OLCI/S3A_OL_SRF_20160713_mean_rsr.nc4")
 def load_OLCIA():
     return load_OLCI("A")
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/OLCI/S3B_OL_SRF_0_20180109_mean_rsr.nc4")
 def load_OLCIB():
     return load_OLCI("B")
 
 
+@memoize_sensor
+@cache_sensor("spectral_response/SPECTACLE/*.npy")
 def load_SPECTACLE():
     files = list(Path("spectral_response/SPECTACLE/").glob("*.npy"))
     devices = [file.stem for file in files]
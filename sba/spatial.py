@@ -0,0 +1,109 @@
+"""
+Module with a spatial and temporal index over in-situ spectra, for selecting
+spectra by location and time (e.g. regional breakdowns or satellite matchups)
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+earth_radius = 6371.0  # km
+
+
+def to_unit_sphere(latitude, longitude):
+    # Cartesian coordinates (x, y, z) on the unit sphere, from latitude and longitude in degrees
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    cos_latitude = np.cos(latitude)
+    return np.stack([cos_latitude * np.cos(longitude), cos_latitude * np.sin(longitude), np.sin(latitude)], axis=-1)
+
+
+def chord_length(distance):
+    # Straight-line distance on the unit sphere corresponding to a great-circle `distance` in km
+    angle = np.minimum(np.asarray(distance, dtype=np.float64) / earth_radius, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+class SpectraIndex(object):
+    """
+    Index over spectra with known positions and/or times, e.g. the rows of a
+    `sba.io.Corpus`. Positions are kept in a KD-tree on the unit sphere and
+    times in a sorted array, so selections only look at nearby spectra.
+    All queries return sorted indices into `rows`.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.latitude = np.asarray(rows["latitude"], dtype=np.float64)
+        self.longitude = np.asarray(rows["longitude"], dtype=np.float64)
+        self.time = np.asarray(rows["time"], dtype="datetime64[s]")
+
+        # Only rows with known coordinates go into the tree
+        self.located = np.where(np.isfinite(self.latitude) & np.isfinite(self.longitude))[0]
+        self.tree = cKDTree(to_unit_sphere(self.latitude[self.located], self.longitude[self.located]))
+        self.latitude_order = self.located[np.argsort(self.latitude[self.located], kind="stable")]
+        self.latitude_sorted = self.latitude[self.latitude_order]
+
+        # Only rows with known times go into the time index
+        timed = np.where(~np.isnat(self.time))[0]
+        order = np.argsort(self.time[timed], kind="stable")
+        self.time_order = timed[order]
+        self.time_sorted = self.time[self.time_order]
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        return cls(corpus.rows)
+
+    def __repr__(self):
+        return f"SpectraIndex ({len(self.rows)} spectra, {len(self.located)} with coordinates, {len(self.time_order)} with times)"
+
+    def __len__(self):
+        return len(self.rows)
+
+    def query_time(self, start, end):
+        # Indices of spectra with start <= time <= end
+        first = np.searchsorted(self.time_sorted, np.datetime64(start, "s"), side="left")
+        last = np.searchsorted(self.time_sorted, np.datetime64(end, "s"), side="right")
+        return np.sort(self.time_order[first:last])
+
+    def query_radius(self, latitude, longitude, radius, time=None, hours=None):
+        """
+        Indices of spectra within `radius` km (great-circle distance) of a
+        point. If `time` and `hours` are given, only spectra within `hours`
+        of `time` are included.
+        """
+        point = to_unit_sphere(latitude, longitude)
+        indices = self.located[self.tree.query_ball_point(point, chord_length(radius))]
+        if time is not None and hours is not None:
+            time = np.datetime64(time, "s")
+            window = np.timedelta64(int(round(hours * 3600)), "s")
+            times = self.time[indices]
+            indices = indices[~np.isnat(times) & (np.abs(times - time) <= window)]
+        return np.sort(indices)
+
+    def query_bbox(self, latitude_range, longitude_range, months=None):
+        """
+        Indices of spectra within a bounding box given by `latitude_range`
+        and `longitude_range` (minimum, maximum; in degrees). If the minimum
+        longitude is greater than the maximum, the box crosses the dateline.
+        If `months` (1-12) are given, only spectra from those months are
+        included, e.g. months=[12, 1, 2] for northern winter.
+        """
+        longitude_min, longitude_max = longitude_range
+        first = np.searchsorted(self.latitude_sorted, latitude_range[0], side="left")
+        last = np.searchsorted(self.latitude_sorted, latitude_range[1], side="right")
+        indices = self.latitude_order[first:last]
+
+        longitude = self.longitude[indices]
+        if longitude_min <= longitude_max:
+            indices = indices[(longitude >= longitude_min) & (longitude <= longitude_max)]
+        else:
+            indices = indices[(longitude >= longitude_min) | (longitude <= longitude_max)]
+
+        if months is not None:
+            indices = indices[np.isin(self.get_months(indices), months)]
+        return np.sort(indices)
+
+    def get_months(self, indices=slice(None)):
+        # Month (1-12) of each spectrum, 0 where the time is unknown
+        times = self.time[indices]
+        months = times.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        return np.where(np.isnat(times), 0, months)
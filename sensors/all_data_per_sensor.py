@@ -1,24 +1,20 @@
-from sba.bandaveraging import calculate_differences
-from sba.io import load_data_file
+from sba.io import load_data_files, find_data_files
 from sba.response_curves import load_all_sensors
-from pathlib import Path
 from matplotlib import pyplot as plt
 import numpy as np
 import warnings
 
 sensors = load_all_sensors()
 
-data_files = Path("data").glob("*processed.tab")
+data_files = find_data_files("data")
 
-labels, wavelengths, Eds, Lws, R_rss = zip(*[load_data_file(file) for file in data_files])
+labels, wavelengths, Eds, Lws, R_rss = zip(*load_data_files(data_files))
 
 def get_differences(band):
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        RrsR = [band.convolve(wavelengths_data, R_rs) for wavelengths_data, R_rs in zip(wavelengths, R_rss)]
-        RrsL = [band.convolve(wavelengths_data, Lw)/band.convolve(wavelengths_data, Ed) for wavelengths_data, Ed, Lw in zip(wavelengths, Eds, Lws)]
-
-        difference_absolute, difference_relative = zip(*[calculate_differences(reflectance_space, radiance_space) for reflectance_space, radiance_space in zip(RrsR, RrsL)])
+        results = [band.convolve_reflectance_radiance(wavelengths_data, Ed, Lw, R_rs) for wavelengths_data, Ed, Lw, R_rs in zip(wavelengths, Eds, Lws, R_rss)]
+        RrsR, RrsL, difference_absolute, difference_relative = zip(*results)
 
     # Get all differences into one array
     difference_absolute = np.array([x for y in difference_absolute for x in y]) * 1e6
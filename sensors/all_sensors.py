@@ -2,7 +2,6 @@
 Generate boxcar and gaussian spectral response functions
 """
 
-from sba.bandaveraging import calculate_differences
 from sba.io import load_data
 from sba.response_curves import load_all_sensors
 from sba import plotting as p
@@ -12,10 +11,8 @@ label, wavelengths_data, Ed, Lw, R_rs = load_data()
 
 sensors = load_all_sensors()
 
-reflectance_space = np.vstack([sensor.band_average(wavelengths_data, R_rs) for sensor in sensors])
-radiance_space = np.vstack([sensor.band_average(wavelengths_data, Lw) / sensor.band_average(wavelengths_data, Ed)  for sensor in sensors])
-
-difference_absolute, difference_relative = calculate_differences(reflectance_space, radiance_space)
+results = [sensor.band_average_reflectance_radiance(wavelengths_data, Ed, Lw, R_rs) for sensor in sensors]
+reflectance_space, radiance_space, difference_absolute, difference_relative = [np.vstack(result) for result in zip(*results)]
 
 labels = [sensor.sensor_band_labels for sensor in sensors]
 labels = [label for sublist in labels for label in sublist]
@@ -2,7 +2,6 @@
 Generate boxcar and gaussian spectral response functions
 """
 
-from sba.bandaveraging import calculate_differences
 from sba.io import load_data
 from sba.response_curves import load_from_name
 
@@ -12,10 +11,7 @@ sensors = load_from_name()
 for sensor in sensors:
     print(sensor)
 
-    reflectance_space = sensor.band_average(wavelengths_data, R_rs)
-    radiance_space = sensor.band_average(wavelengths_data, Lw) / sensor.band_average(wavelengths_data, Ed)
-
-    difference_absolute, difference_relative = calculate_differences(reflectance_space, radiance_space)
+    reflectance_space, radiance_space, difference_absolute, difference_relative = sensor.band_average_reflectance_radiance(wavelengths_data, Ed, Lw, R_rs)
 
     sensor.boxplot_absolute(difference_absolute, data_label=label)
     sensor.boxplot_relative(difference_relative, data_label=label)
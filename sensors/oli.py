@@ -1,7 +1,5 @@
-from sba.bandaveraging import calculate_differences
-from sba.io import load_data_file
+from sba.io import load_data_files, find_data_files
 from sba.response_curves import load_OLI
-from pathlib import Path
 from matplotlib import pyplot as plt
 import warnings
 import numpy as np
@@ -14,17 +12,15 @@ def ylim(axs):
     axs[1].set_ylim(-1.5, 0.4)
     axs[1].set_yticks([-1, -0.5, 0])
 
-data_files = Path("data").glob("*processed.tab")
+data_files = find_data_files("data")
 
-labels, wavelengths, Eds, Lws, R_rss = zip(*[load_data_file(file) for file in data_files])
+labels, wavelengths, Eds, Lws, R_rss = zip(*load_data_files(data_files))
 
 def get_differences(band):
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        RrsR = [band.convolve(wavelengths_data, R_rs) for wavelengths_data, R_rs in zip(wavelengths, R_rss)]
-        RrsL = [band.convolve(wavelengths_data, Lw)/band.convolve(wavelengths_data, Ed) for wavelengths_data, Ed, Lw in zip(wavelengths, Eds, Lws)]
-
-        difference_absolute, difference_relative = zip(*[calculate_differences(reflectance_space, radiance_space) for reflectance_space, radiance_space in zip(RrsR, RrsL)])
+        results = [band.convolve_reflectance_radiance(wavelengths_data, Ed, Lw, R_rs) for wavelengths_data, Ed, Lw, R_rs in zip(wavelengths, Eds, Lws, R_rss)]
+        RrsR, RrsL, difference_absolute, difference_relative = zip(*results)
 
     # Get all differences into one array
     difference_absolute = np.array([x for y in difference_absolute for x in y]) * 1e6
@@ -131,10 +127,8 @@ print(f"     {band}")
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
-    RrsR = [band.convolve(wavelengths_data, R_rs) for wavelengths_data, R_rs in zip(wavelengths, R_rss)]
-    RrsL = [band.convolve(wavelengths_data, Lw)/band.convolve(wavelengths_data, Ed) for wavelengths_data, Ed, Lw in zip(wavelengths, Eds, Lws)]
-
-    difference_absolute, difference_relative = zip(*[calculate_differences(reflectance_space, radiance_space) for reflectance_space, radiance_space in zip(RrsR, RrsL)])
+    results = [band.convolve_reflectance_radiance(wavelengths_data, Ed, Lw, R_rs) for wavelengths_data, Ed, Lw, R_rs in zip(wavelengths, Eds, Lws, R_rss)]
+    RrsR, RrsL, difference_absolute, difference_relative = zip(*results)
 
 # Convert to 10^-6 sr
 difference_absolute = [1e6 * diff for diff in difference_absolute]
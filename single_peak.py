@@ -5,7 +5,6 @@ Bias as function of distance between peak center and band center, at several FWH
 import numpy as np
 from matplotlib import pyplot as plt
 from sba.response_curves import generate_boxcar
-from sba.bandaveraging import calculate_differences
 
 wavelengths = np.arange(0, 100, 0.1)
 
@@ -26,10 +25,7 @@ for i,center_sensor in enumerate(central_wavelengths):
     for j,fwhm_sensor in enumerate(FWHMs):
         sensor = generate_boxcar(center_sensor, fwhm_sensor)
 
-        reflectance_space = sensor.band_average(wavelengths, [R_rs])
-        radiance_space = sensor.band_average(wavelengths, [Lw]) / sensor.band_average(wavelengths, [Ed])
-
-        difference_absolute, difference_relative = calculate_differences(reflectance_space, radiance_space)
+        reflectance_space, radiance_space, difference_absolute, difference_relative = sensor.band_average_reflectance_radiance(wavelengths, [Ed], [Lw], [R_rs])
 
         results[i,j] = difference_relative[0,0]
 